@@ -0,0 +1,61 @@
+"""Memory benchmark for compactFrame on a synthetic users/extended roster
+
+Usage:
+    python benchmarks/bench_compact.py [rows]
+"""
+import sys
+import time
+
+import numpy as np
+
+from sky.utils import compactFrame, normalizePage
+
+
+def roster(rows: int) -> list:
+    """Builds records shaped like the users/extended endpoint"""
+    rng = np.random.default_rng(0)
+    roles = ["Student", "Parent", "Teacher", "Staff", "Coach"]
+    grades = [f"{i}th Grade" for i in range(6, 13)]
+    records = []
+    for i in range(rows):
+        records.append(
+            {
+                "id": 4700000 + i,
+                "first_name": f"First{i}",
+                "last_name": f"Last{rng.integers(0, rows // 4 + 1)}",
+                "email": f"user{i}@school.org",
+                "host_id": None if i % 7 == 0 else 6000 + i,
+                "base_role": roles[rng.integers(0, len(roles))],
+                "student_info": {
+                    "grade_level_description": grades[rng.integers(0, len(grades))],
+                    "grad_year": str(2024 + rng.integers(0, 7)),
+                    "advisor_id": None if i % 3 else float(rng.integers(1, 200)),
+                },
+                "address": {
+                    "city": ["Springfield", "Shelbyville", "Ogdenville"][i % 3],
+                    "state": "IL",
+                    "postal_code": f"{60000 + i % 500}",
+                },
+            }
+        )
+    return records
+
+
+def main(rows: int = 200_000) -> None:
+    df = normalizePage(roster(rows))
+    before = df.memory_usage(deep=True).sum()
+
+    start = time.perf_counter()
+    compact = compactFrame(df)
+    elapsed = time.perf_counter() - start
+    after = compact.memory_usage(deep=True).sum()
+
+    print(f"rows: {rows:,}")
+    print(f"default dtypes: {before / 2**20:8.1f} MiB")
+    print(f"compact dtypes: {after / 2**20:8.1f} MiB ({after / before:.0%})")
+    print(f"compactFrame:   {elapsed:8.2f} s")
+    print(compact.dtypes.to_string())
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
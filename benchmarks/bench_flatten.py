@@ -0,0 +1,37 @@
+"""Parse time of a compiled Flattener against pd.json_normalize
+
+Usage:
+    python benchmarks/bench_flatten.py [rows] [pages]
+"""
+import sys
+import time
+
+import pandas as pd
+
+from bench_compact import roster
+from sky.flatten import Flattener
+
+
+def main(rows: int = 100_000, pages: int = 100) -> None:
+    records = roster(rows)
+    size = rows // pages
+    chunks = [records[i : i + size] for i in range(0, rows, size)]
+
+    start = time.perf_counter()
+    generic = pd.concat([pd.json_normalize(c) for c in chunks], ignore_index=True)
+    generic_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    flattener = Flattener.infer(chunks[0])
+    compiled = pd.concat([flattener(c) for c in chunks], ignore_index=True)
+    compiled_time = time.perf_counter() - start
+
+    print(f"rows: {rows:,} in {len(chunks)} pages")
+    print(f"pd.json_normalize: {generic_time:6.2f} s")
+    print(f"Flattener:         {compiled_time:6.2f} s ({generic_time / compiled_time:.1f}x)")
+    print(f"identical output:  {generic.equals(compiled)}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -10,4 +10,5 @@ setup(
     package_dir={"": "src"},
     packages=find_packages(where="src"),
     test_suite="nose.collector",
+    entry_points={"console_scripts": ["sky-extract=sky.cli:main"]},
 )
@@ -1,8 +1,34 @@
-from .sky import Sky
-from .utils import authorizationApp, cleanAdvancedList, isActiveTerm
+from .core import SkyCore, authorizationApp
+from .ratelimit import RateBudget
 
 # Set default logging handler to avoid "No handler found" warnings.
 import logging
 from logging import NullHandler
 
 logging.getLogger(__name__).addHandler(NullHandler())
+
+# Names that need pandas are imported on first use so that SkyCore can be
+# used where pandas isn't installed
+_PANDAS = {
+    "Sky": ".sky",
+    "EntityGraph": ".graph",
+    "Flattener": ".flatten",
+    "Mirror": ".mirror",
+    "cleanAdvancedList": ".utils",
+    "isActiveTerm": ".utils",
+}
+
+
+def __getattr__(name):
+    if name not in _PANDAS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    try:
+        module = importlib.import_module(_PANDAS[name], __name__)
+    except ImportError as e:
+        raise ImportError(
+            f"sky.{name} requires pandas. Install it with "
+            "`pip install sky-api-python-client[pandas]` or use sky.SkyCore"
+        ) from e
+    return getattr(module, name)
@@ -20,7 +20,6 @@ from authlib.integrations.requests_client import OAuth2Session
 from authlib.oauth2.rfc6749.wrappers import OAuth2Token
 from os.path import exists
 
-from numpy import isin
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -0,0 +1,49 @@
+import shelve
+
+from typing import Union, Tuple, Hashable
+
+
+class Checkpoint:
+    def __init__(self, path: str, key: Hashable):
+        """Local store of the pages already fetched by a paginated pull
+
+        Decoded pages are written to a :mod:`shelve` file as they arrive together
+        with the position of the next page, so an interrupted pull can resume
+        where it stopped instead of starting over from page 1.
+
+        Args:
+            path: Path of the shelve file used to store the checkpoint
+            key: Identifies the pull (e.g. url and params). A checkpoint saved
+            for a different key is discarded
+        """
+        self.path = path
+        self.key = repr(key)
+
+    def load(self) -> Tuple[Union[str, int, None], list]:
+        """Load a saved checkpoint
+
+        Returns:
+            The position of the next page and the list of saved pages. The
+            position is None when there's nothing to resume
+        """
+        with shelve.open(self.path) as db:
+            if db.get("key") != self.key:
+                return None, []
+            pages = [db[f"page{i}"] for i in range(db["pages"])]
+            return db["next"], pages
+
+    def addPage(self, records: list, next: Union[str, int, None]) -> None:
+        """Save a decoded page and the position of the page that follows it"""
+        with shelve.open(self.path) as db:
+            if db.get("key") != self.key:
+                db.clear()
+                db["key"] = self.key
+                db["pages"] = 0
+            db[f"page{db['pages']}"] = records
+            db["next"] = next
+            db["pages"] += 1
+
+    def clear(self) -> None:
+        """Remove the checkpoint once the pull has completed"""
+        with shelve.open(self.path) as db:
+            db.clear()
@@ -0,0 +1,274 @@
+"""sky-extract: run several Sky API extracts concurrently
+
+Here's an example of pulling a few jobs into Parquet files::
+
+    sky-extract --format parquet --output-dir extracts \\
+        users:student,parent list:73113 enrollments sections:US \\
+        "get:academics/departments" "get:users/extended?base_role_ids=3"
+
+Job specs:
+    get:ENDPOINT[?QUERY]   Sky.get (a bare ENDPOINT works too)
+    list:ID                Sky.getAdvancedList
+    users:ROLE[,ROLE...]   Sky.getUsers
+    enrollments[:ID,...]   Sky.getStudentEnrollments
+    sections[:LEVEL]       Sky.getSections, LEVEL is a level abbreviation
+
+get and enrollments jobs are written page by page (student by student) as
+they arrive. users, list and sections jobs are written once complete, since
+their helpers combine every page (dedupe users, pivot list rows, merge head
+teachers). Parquet output needs pyarrow, installed with the extract extra.
+"""
+import argparse
+import csv
+import importlib.util
+import os
+import re
+import sys
+import tempfile
+import time
+import urllib.parse as urlparse
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+from .ratelimit import RateBudget
+
+# The command is installed without the pandas extra too, see main
+_MISSING = None
+try:
+    import pandas as pd
+
+    from .sky import Sky
+except ImportError as e:
+    pd = Sky = None
+    _MISSING = e
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+class PageWriter:
+    def __init__(self, path: str, fmt: str):
+        """Output file that DataFrames are appended to as they arrive
+
+        Only the current page is held in memory. Pages don't always share
+        their columns, so when one brings new columns (or, for Parquet, types
+        that don't fit the file) what was written so far is rewritten once
+        with the combined columns.
+
+        Args:
+            path: Path of the output file
+            fmt: One of FORMATS
+        """
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self.columns = None
+        self._writer = None
+
+    def write(self, df: "pd.DataFrame") -> None:
+        if not len(df.columns):
+            return
+        if self.fmt == "csv":
+            self._writeCsv(df)
+        elif self.fmt == "jsonl":
+            with open(self.path, "a" if self.columns else "w") as f:
+                if len(df):
+                    f.write(df.to_json(orient="records", lines=True).rstrip("\n") + "\n")
+            self.columns = list(df.columns)
+        else:
+            self._writeParquet(df)
+        self.rows += len(df)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _writeCsv(self, df: "pd.DataFrame") -> None:
+        if self.columns is None:
+            self.columns = list(df.columns)
+            df.to_csv(self.path, index=False)
+            return
+        new = [column for column in df.columns if column not in self.columns]
+        if new:
+            # Rewriting the rows so far under the wider header, line by line
+            tmp = f"{self.path}.tmp"
+            with open(self.path, newline="") as old, open(tmp, "w", newline="") as f:
+                rows = csv.reader(old)
+                out = csv.writer(f)
+                next(rows)
+                out.writerow(self.columns + new)
+                out.writerows(row + [""] * len(new) for row in rows)
+            os.replace(tmp, self.path)
+            self.columns += new
+        df.reindex(columns=self.columns).to_csv(
+            self.path, mode="a", header=False, index=False
+        )
+
+    def _writeParquet(self, df: "pd.DataFrame") -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            try:
+                table = _conform(table, self._writer.schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, KeyError):
+                # Combining the file so far with the page under a common schema
+                self._writer.close()
+                table = pa.concat_tables(
+                    [pq.read_table(self.path), table], promote_options="permissive"
+                )
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+        self.columns = table.schema.names
+
+
+def _conform(table, schema):
+    """Cast a pyarrow table to schema, adding its missing columns as nulls
+
+    Raises:
+        KeyError: If the table has columns the schema doesn't
+    """
+    import pyarrow as pa
+
+    extra = set(table.column_names) - set(schema.names)
+    if extra:
+        raise KeyError(extra)
+    columns = [
+        table[field.name].cast(field.type)
+        if field.name in table.column_names
+        else pa.nulls(len(table), field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def runJob(sky: "Sky", spec: str, writer: PageWriter) -> None:
+    """Run a single job spec against the Sky API
+
+    Args:
+        sky: Sky client shared by every job
+        spec: Job spec, see the module docstring
+        writer: Output the job's DataFrames are written to
+    """
+    kind, _, arg = spec.partition(":")
+    if not arg and kind not in ("enrollments", "sections"):
+        kind, arg = "get", spec
+    if kind == "get":
+        endpoint, _, query = arg.partition("?")
+        params = dict(urlparse.parse_qsl(query)) or None
+        data = sky.get(endpoint, params=params, sink=writer.write)
+    elif kind == "list":
+        data = sky.getAdvancedList(int(arg))
+    elif kind == "users":
+        data = sky.getUsers(arg.split(","))
+    elif kind == "enrollments":
+        students = [int(i) for i in arg.split(",")] if arg else None
+        if not students:
+            students = sky.getUsers(fields=["id"]).id.tolist()
+        for user_id in students:
+            writer.write(sky.getStudentEnrollments(user_id))
+        data = None
+    elif kind == "sections":
+        data = sky.getSections(abbv=arg or None)
+    else:
+        raise ValueError(f"Unknown job type: {kind}")
+    if data is not None and not isinstance(data, pd.DataFrame):
+        raise RuntimeError(f"Invalid request: {data}")
+    if data is not None:
+        writer.write(data)
+
+
+def outputPath(output_dir: str, spec: str, fmt: str) -> str:
+    """File a job's results are written to"""
+    name = re.sub("[^\\w.-]+", "_", spec).strip("_")
+    return os.path.join(output_dir, f"{name}.{fmt}")
+
+
+def parseArgs(argv: Union[list, None] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="sky-extract",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("jobs", nargs="+", help="Job specs to run")
+    parser.add_argument(
+        "-f", "--format", choices=FORMATS, default="csv", help="Output format"
+    )
+    parser.add_argument("-o", "--output-dir", default=".", help="Output directory")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=4, help="Jobs run at the same time"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=10, help="Requests per second shared by all jobs"
+    )
+    parser.add_argument(
+        "--budget",
+        default=os.path.join(tempfile.gettempdir(), "sky-extract-budget"),
+        help="Rate budget file, shared with other processes that use the same path",
+    )
+    parser.add_argument("--api-key", default=None, help="Defaults to BB_API_KEY")
+    parser.add_argument(
+        "--credentials", default="sky_credentials.json", help="Sky credentials file"
+    )
+    parser.add_argument("--token-path", default=None, help="Cached token file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Union[list, None] = None) -> int:
+    args = parseArgs(argv)
+    if Sky is None:
+        print(
+            f"sky-extract requires pandas ({_MISSING}). Install it with "
+            "`pip install sky-api-python-client[pandas]`",
+            file=sys.stderr,
+        )
+        return 1
+    if args.format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        print(
+            "sky-extract --format parquet requires pyarrow. Install it with "
+            "`pip install sky-api-python-client[extract]`",
+            file=sys.stderr,
+        )
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+    sky = Sky(
+        api_key=args.api_key,
+        file_path=args.credentials,
+        token_path=args.token_path,
+        rate_budget=RateBudget(args.budget, rate=args.rate),
+    )
+    # Authorizing once up front so the jobs don't race to refresh the token
+    sky.connect()
+
+    def timed(spec: str) -> dict:
+        start = time.perf_counter()
+        result = {"job": spec, "rows": 0, "output": "", "status": "ok"}
+        writer = PageWriter(outputPath(args.output_dir, spec, args.format), args.format)
+        try:
+            runJob(sky, spec, writer)
+        except Exception as e:
+            result["status"] = f"failed: {e}"
+        finally:
+            writer.close()
+        if writer.columns is not None:
+            result["output"] = writer.path
+            result["rows"] = writer.rows
+        result["seconds"] = round(time.perf_counter() - start, 2)
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(timed, args.jobs))
+
+    summary = pd.DataFrame(results, columns=["job", "rows", "seconds", "status", "output"])
+    print(summary.to_string(index=False))
+    print(f"\nTotal: {time.perf_counter() - start:.2f} s")
+    return 0 if (summary.status == "ok").all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
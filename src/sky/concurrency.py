@@ -0,0 +1,122 @@
+import threading
+
+from contextlib import contextmanager
+from typing import Union
+
+
+class AdaptiveConcurrency:
+    def __init__(
+        self,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 16,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        spike: float = 3.0,
+        smoothing: float = 0.2,
+    ):
+        """Adaptive (AIMD) limit on the number of requests in flight
+
+        While requests succeed with normal latency the limit grows additively,
+        by about `increase` for every `limit` requests. A 429, a 5xx, a failed
+        request or a latency spike cuts it multiplicatively by `decrease`, at
+        most once per round of requests so a burst of errors counts once.
+
+        Here's an example of reading the current limit::
+
+        sky.getStudentEnrollments(parallel=True)
+        sky.concurrency.limit
+        sky.concurrency.metrics()
+
+        Args:
+            initial: Starting limit
+            minimum: Lowest limit
+            maximum: Highest limit, also the size of the helpers' thread pools
+            increase: Additive increase per round of successful requests
+            decrease: Factor applied to the limit on throttling
+            spike: A request slower than spike times the average latency
+            counts as a latency spike
+            smoothing: Weight of the newest latency in the moving average
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.spike = spike
+        self.smoothing = smoothing
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.latency = None
+        self.successes = 0
+        self.throttled = 0
+        self.errors = 0
+        # No further cuts until this many more requests have completed
+        self._cooldown = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self, timeout: Union[float, None] = None):
+        """Wait until the number of tasks in flight is under the limit
+
+        Args:
+            timeout: Seconds to wait for a slot before raising TimeoutError
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self.in_flight < int(self.limit), timeout=timeout
+            ):
+                raise TimeoutError("Timed out waiting for a request slot")
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def record(self, latency: float, status: Union[int, None]) -> None:
+        """Record the outcome of a request
+
+        Args:
+            latency: Seconds the request took
+            status: HTTP status code, or None if the request failed
+        """
+        with self._condition:
+            self._cooldown = max(self._cooldown - 1, 0)
+            if status is None or status >= 500:
+                self.errors += 1
+                self._cut()
+            elif status == 429:
+                self.throttled += 1
+                self._cut()
+            elif self.latency is not None and latency > self.spike * self.latency:
+                self._cut()
+            else:
+                self.successes += 1
+                self.limit = min(self.limit + self.increase / self.limit, self.maximum)
+            # Throttled responses return quickly and would skew the average down
+            if status is not None and status != 429:
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency += self.smoothing * (latency - self.latency)
+            self._condition.notify_all()
+
+    def metrics(self) -> dict:
+        """Current limit and counters, e.g. for logging or a metrics exporter"""
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "latency": self.latency,
+                "successes": self.successes,
+                "throttled": self.throttled,
+                "errors": self.errors,
+            }
+
+    def _cut(self) -> None:
+        """Multiplicative decrease, skipped while cooling down from the last cut"""
+        if self._cooldown:
+            return
+        self.limit = max(self.limit * self.decrease, self.minimum)
+        self._cooldown = max(int(self.limit), 1) + self.in_flight
@@ -0,0 +1,537 @@
+import os
+import pickle
+import re
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from logging import warn
+from typing import Callable, Union
+
+from authlib.integrations.requests_client import OAuth2Session
+from requests.exceptions import Timeout
+
+from .auth import AuthApp, OAuth2Token
+from .concurrency import AdaptiveConcurrency
+from .exceptions import DeadlineExceeded
+from .httpRequest import (
+    DeleteRequest,
+    GetRequest,
+    PatchRequest,
+    PostRequest,
+    StreamedPage,
+)
+from .profiling import Profiler, stage
+from .ratelimit import RateBudget
+
+
+def authorize(func):
+    """Load OAuth2Session
+
+    A :class:`authlib.integrations.requests_client.OAuth2Session ` is needed in order to
+    call the sky api and save api tokens.
+
+    loadClient first attempts to load a token from the users cache but if there's no token
+    available it will automatically launch a local web server in order to authenticate you
+    with the Sky API
+    """
+
+    def wrap(*args, **kwargs):
+        # Assing the sky instance
+        skyObject = args[0]
+
+        # Chcking if theres a client existant
+        if not skyObject.client:
+            with stage(skyObject.profiler, "auth"):
+                # Chccking if the user already has a token caced
+                if not skyObject._loadCachedToken():
+                    authorizationApp(skyObject)
+                # Initalizing the client class
+                skyObject.client = oauthSession(skyObject.token)
+                # Updating access token and preserving refresh token
+                skyObject.client.refresh_token(
+                    "https://oauth2.sky.blackbaud.com/token", preserve_refresh_token=True
+                )
+        # Running the call function
+        return func(*args, **kwargs)
+
+    return wrap
+
+
+def oauthSession(token: dict) -> OAuth2Session:
+    """OAuth2Session for the Sky API from a token holding client_id and client_secret"""
+    return OAuth2Session(
+        token=token,
+        client_id=token["client_id"],
+        client_secret=token["client_secret"],
+        token_endpoint="https://oauth2.sky.blackbaud.com/token",
+        token_endpoint_auth_method="client_secret_basic",
+        preserve_refresh_token=True,
+    )
+
+
+def authorizationApp(skyObject) -> None:
+    """Launch server to retrieve Sky API token"""
+    # Checking if the user passed in a valid dictionary with their credentials
+    if skyObject.credentials and isinstance(skyObject.credentials, dict):
+        valid_credentials = (
+            skyObject.credentials.get("client_id")
+            and skyObject.credentials.get("client_secret")
+            and skyObject.credentials.get("redirect_uri")
+        )
+        if valid_credentials:
+            app = AuthApp.load_credentials(skyObject.credentials)
+        else:
+            # If the credentials aren't valid then passing in the path to sky_credentials.json
+            app = AuthApp.load_credentials(skyObject.file_path)
+    else:
+        # If the user didn't pass in a dict then passing in the path to sky_credentials.json
+        app = AuthApp.load_credentials(skyObject.file_path)
+    # Launching a local server
+    skyObject.token = app.run_local_server()
+    # Saving the new api token
+    skyObject._saveToken(skyObject.token)
+
+
+class Deadline:
+    def __init__(self, seconds: Union[float, None] = None):
+        """Tracks the time left before a call's deadline
+
+        Args:
+            seconds: Time allowed for the call. None means no deadline
+        """
+        self.seconds = seconds
+        self.expires = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> Union[float, None]:
+        """Seconds left before the deadline, or None if there's no deadline"""
+        if self.expires is None:
+            return None
+        return max(self.expires - time.monotonic(), 0)
+
+    def expired(self) -> bool:
+        """True once the deadline has passed"""
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def timeout(self, timeout: Union[float, None] = None) -> Union[float, None]:
+        """A request timeout that doesn't run past the deadline"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+
+def _partialResult(future: Future):
+    """Result of a fan-out call, its partial result if it ran past the deadline"""
+    if not future.done() or future.cancelled():
+        return None
+    error = future.exception()
+    if error is None:
+        return future.result()
+    return error.partial if isinstance(error, DeadlineExceeded) else None
+
+
+class SkyCore:
+    def __init__(
+        self,
+        api_key: Union[str, None] = None,
+        file_path: str = "sky_credentials.json",
+        token_path: Union[str, None] = None,
+        credentials: dict = None,
+        rate_budget: Union[RateBudget, None] = None,
+        timeout: Union[float, None] = None,
+        concurrency: Union[AdaptiveConcurrency, None] = None,
+    ):
+        """Blackbaud Sky API client without the pandas dependency
+
+        This class uses a :class:`authlib.integrations.requests_client.OAuth2Session` for
+        calls to the Blackbaud Sky API. It handles authorization, requests and
+        pagination and returns plain dicts and lists, so it can be installed
+        and imported without pandas (e.g. in serverless functions). See
+        :class:`sky.Sky` for the DataFrame helpers.
+
+        A :class:`sky.ratelimit.RateBudget` can be passed as rate_budget so that
+        several processes on one host share the same request budget, and
+        timeout sets the number of seconds a single request may take.
+        concurrency is the :class:`sky.concurrency.AdaptiveConcurrency` that
+        limits the requests in flight when helpers are called with parallel=True.
+        """
+        self.token = None
+        self.client = None
+        self.file_path = file_path
+        self.credentials = credentials
+        self.rate_budget = rate_budget
+        self.timeout = timeout
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        # Set while a self.profile() block is running, to the latest one if
+        # several are
+        self.profiler = None
+        self._profilers = []
+        self._profilers_lock = threading.Lock()
+        # Tokens may be refreshed from several threads at once
+        self._token_lock = threading.Lock()
+
+        # Seeing if the user saved the api key as an environment variable
+        if os.getenv("BB_API_KEY"):
+            self.api_key = os.getenv("BB_API_KEY")
+        elif api_key:
+            self.api_key = api_key
+        else:
+            warn(
+                """
+            A api key is needed to call the Blackbaud sky api. You can either initialize it when calling
+            the Sky class or you can save it in a environment variable called BB_API_KEY
+            """
+            )
+
+        # Path to cached token
+        if token_path:
+            self.token_path = token_path
+        elif os.getenv("BB_TOKEN_PATH"):
+            self.token_path = os.getenv("BB_TOKEN_PATH")
+        else:
+            self.token_path = ".sky-token"
+
+    @contextmanager
+    def profile(self, memory: bool = True):
+        """Profile every Sky call made inside the block
+
+        Here's an example of profiling a helper::
+
+        with sky.profile() as profiler:
+            sky.enrollmentMedley()
+        print(profiler.table())
+        profiler.report()
+
+        Blocks can be nested: calls made in the inner block are recorded by
+        its profiler, and the outer one records again once it exits.
+
+        Args:
+            memory: If True memory is traced with tracemalloc
+
+        Returns:
+            A :class:`sky.profiling.Profiler` with the time spent in auth,
+            network, decode, normalize, concat, postprocess and wait stages
+        """
+        profiler = Profiler(memory=memory)
+        with self._profilers_lock:
+            self._profilers.append(profiler)
+            self.profiler = profiler
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            # Handing back to the block still running, which may not be the
+            # enclosing one when blocks run on several threads
+            with self._profilers_lock:
+                self._profilers.remove(profiler)
+                self.profiler = self._profilers[-1] if self._profilers else None
+
+    @authorize
+    def connect(self) -> OAuth2Session:
+        """Authorize with the Sky API ahead of the first request
+
+        Returns:
+            The authorized :class:`authlib.integrations.requests_client.OAuth2Session`
+        """
+        return self.client
+
+    @authorize
+    def getRecords(
+        self,
+        endpoint: str = "roles",
+        params: Union[dict, None] = None,
+        reference: str = "school",
+        deadline: Union[float, None] = None,
+    ) -> Union[list, dict, None]:
+        """Get request to the Sky API following every page of the response
+        Args:
+            params: Dictionary that defines parameters to be passed to
+            the api
+            reference: Which SKY Api refrence are you calling. See them here
+            https://developer.blackbaud.com/skyapi/apis
+            endpoint: The specific endpioint that exist in the given api reference
+            deadline: Seconds the whole call may take. Once it passes
+            sky.exceptions.DeadlineExceeded is raised with the records fetched
+            so far as its partial attribute
+        Returns:
+           List with the records of every page, or the response dictionary for
+           endpoints that return a single record (or an error)
+        """
+        clock = Deadline(deadline)
+        url = self._get_url(reference, endpoint)
+        records = []
+        while True:
+            if clock.expired():
+                raise DeadlineExceeded(
+                    f"Deadline exceeded calling {endpoint}", partial=records
+                )
+            try:
+                data = self._getPage(url, params, clock)
+            except (Timeout, DeadlineExceeded) as e:
+                if isinstance(e, DeadlineExceeded) or clock.expired():
+                    raise DeadlineExceeded(
+                        f"Deadline exceeded calling {endpoint}", partial=records
+                    ) from e
+                raise
+            if not data.get("value"):
+                # Single record endpoints (and errors) aren't paginated
+                return records if records else data or None
+            records.extend(data["value"])
+            # Checking for another link
+            if not data.get("next_link"):
+                return records
+            url = self._nextUrl(reference, data["next_link"])
+
+    @authorize
+    def post(
+        self,
+        data: dict,
+        reference: str = "school",
+        endpoint: str = "users",
+    ) -> dict:
+        """Post request to the Sky API
+        Args:
+            data: Dictionary that defines the request data to be passed to
+            the api in order to create a new record
+            reference: Which SKY Api refrence are you calling. See them here
+            https://developer.blackbaud.com/skyapi/apis
+            endpoint: The specific endpioint that exist in the given api reference
+        Returns:
+           Dictionary with data from the sky api
+        """
+        url = self._get_url(reference, endpoint)
+
+        apiCall = PostRequest(
+            self.client,
+            url,
+            self.request_header,
+            data=data,
+            budget=self.rate_budget,
+            timeout=self.timeout,
+            observer=self.concurrency.record,
+            profiler=self.profiler,
+        )
+
+        data = apiCall.getData()
+        self._saveToken(apiCall.updateToken(self.token))
+        return data
+
+    @authorize
+    def patch(
+        self,
+        reference: str = "school",
+        endpoint: str = "users",
+        params: Union[dict, None] = None,
+        body: Union[dict, None] = None,
+        data: Union[dict, None] = None,
+        **kwargs,
+    ) -> dict:
+        """Patch requests to the Sky API
+        Args:
+            data: Dictionary that defines the request data to be passed to
+            the api in order to create a new record
+            reference: Which SKY Api refrence are you calling. See them here
+            https://developer.blackbaud.com/skyapi/apis
+            endpoint: The specific endpioint that exist in the given api reference
+        Returns:
+           Dictionary with data from the sky api
+        """
+        url = self._get_url(reference, endpoint)
+
+        apiCall = PatchRequest(
+            self.client,
+            url,
+            self.request_header,
+            params=params,
+            data=data,
+            budget=self.rate_budget,
+            timeout=self.timeout,
+            observer=self.concurrency.record,
+            profiler=self.profiler,
+        )
+
+        data = apiCall.getData(**kwargs)
+        self._saveToken(apiCall.updateToken(self.token))
+        return data
+
+    @authorize
+    def delete(
+        self,
+        reference: str = "school",
+        endpoint: str = "roles",
+        params: Union[dict, None] = None,
+        data: Union[dict, None] = None,
+        **kwargs,
+    ) -> dict:
+        """Delete requests to the sky API
+
+        Args:
+            reference: Which SKY Api refrence are you calling. See them here
+            https://developer.blackbaud.com/skyapi/apis
+            endpoint: The specific endpioint that exist in the given api reference
+            **kwargs: ... Honestly don't know yet. Never used this endpoint. Just
+            adding for testing
+        Returns:
+           Dictionary with data from the sky api
+        """
+        url = self._get_url(reference, endpoint)
+
+        apiCall = DeleteRequest(
+            self.client,
+            url,
+            self.request_header,
+            params=params,
+            data=data,
+            budget=self.rate_budget,
+            timeout=self.timeout,
+            observer=self.concurrency.record,
+            profiler=self.profiler,
+        )
+
+        data = apiCall.getData(**kwargs)
+        self._saveToken(apiCall.updateToken(self.token))
+        return data
+
+    def _loadCachedToken(self) -> Union[None, OAuth2Token]:
+        """Load Sky API token from cache"""
+        # Loading token from binary file
+        if os.path.exists(self.token_path):
+            with open(self.token_path, "rb") as token:
+                self.token = pickle.load(token)
+        return self.token
+
+    def _get_url(self, reference: str, endpoint: str) -> str:
+        """Format api requests url
+
+        Args:
+            reference:
+            endpoint:
+
+        Returns:
+            API url to call
+        """
+        return f"https://api.sky.blackbaud.com/{reference}/v1/{endpoint}"
+
+    def _getPage(
+        self,
+        url: str,
+        params: Union[dict, None] = None,
+        clock: Union[Deadline, None] = None,
+    ) -> dict:
+        """Fetch a single page from the Sky API and cache the refreshed token
+
+        Retries and waits of the request stop at the deadline of clock, see
+        httpRequest.BaseRequest.
+        """
+        apiCall = GetRequest(
+            self.client,
+            url,
+            self.request_header,
+            params=params,
+            budget=self.rate_budget,
+            timeout=self.timeout,
+            observer=self.concurrency.record,
+            profiler=self.profiler,
+            expires=clock.expires if clock else None,
+        )
+        data = apiCall.getData()
+        self._saveToken(apiCall.updateToken(self.token))
+        return data
+
+    @authorize
+    def _streamPage(
+        self,
+        url: str,
+        params: Union[dict, None] = None,
+        clock: Union[Deadline, None] = None,
+        path: str = "value",
+    ) -> StreamedPage:
+        """Fetch a single page without buffering its body, see GetRequest.streamData"""
+        apiCall = GetRequest(
+            self.client,
+            url,
+            self.request_header,
+            params=params,
+            budget=self.rate_budget,
+            timeout=self.timeout,
+            observer=self.concurrency.record,
+            profiler=self.profiler,
+            expires=clock.expires if clock else None,
+        )
+        page = apiCall.streamData(path)
+        self._saveToken(apiCall.updateToken(self.token))
+        return page
+
+    def fanOut(
+        self, func: Callable, items: list, clock: Deadline, parallel: bool = False
+    ) -> list:
+        """Call func on every item, concurrently if parallel
+
+        Concurrent calls run on a thread pool and the number in flight is
+        limited by self.concurrency. When the deadline passes the remaining
+        calls are cancelled and DeadlineExceeded is raised with the results
+        that completed as its partial attribute. Calls that ran past the
+        deadline contribute the partial result of their own DeadlineExceeded,
+        the rest are None.
+
+        Returns:
+            The results in the order of items
+        """
+        if not parallel:
+            results = []
+            for item in items:
+                try:
+                    results.append(func(item))
+                except DeadlineExceeded as e:
+                    # Keeping what the interrupted call fetched as well
+                    raise DeadlineExceeded(str(e), partial=results + [e.partial]) from e
+            return results
+
+        def run(item):
+            try:
+                with self.concurrency.slot(timeout=clock.remaining()):
+                    if clock.expired():
+                        raise DeadlineExceeded("Deadline exceeded")
+                    return func(item)
+            except TimeoutError as e:
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                raise DeadlineExceeded("Deadline exceeded waiting for a request slot") from e
+
+        # Authorizing once up front so the threads don't race to refresh the token
+        self.connect()
+        with ThreadPoolExecutor(max_workers=self.concurrency.maximum) as executor:
+            futures = [executor.submit(run, item) for item in items]
+            try:
+                with stage(self.profiler, "wait"):
+                    return [future.result() for future in futures]
+            except BaseException as e:
+                for future in futures:
+                    future.cancel()
+                if not isinstance(e, DeadlineExceeded):
+                    raise
+                partial = [_partialResult(future) for future in futures]
+                raise DeadlineExceeded(str(e), partial=partial) from e
+
+    def _nextUrl(self, reference: str, link: str) -> str:
+        """Build the url of the next page from a next_link value"""
+        # Finding the endpoint value
+        end = re.search("v[\\d]/", link).end(0)
+        return self._get_url(reference, link[end:])
+
+    def _saveToken(self, token: OAuth2Token) -> None:
+        """Save OAuth2Token for future use"""
+        with stage(self.profiler, "auth"), self._token_lock:
+            with open(self.token_path, "wb") as f:
+                pickle.dump(token, f)
+            self.token = token
+
+    @property
+    def request_header(self):
+        """API key to pass to Request header"""
+        return {"Bb-Api-Subscription-Key": self.api_key}
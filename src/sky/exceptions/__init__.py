@@ -0,0 +1,14 @@
+from typing import Any
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, message: str, partial: Any = None):
+        """Raised when a call runs past its deadline
+
+        Args:
+            message: Description of the call that timed out
+            partial: The results fetched before the deadline passed, usually a
+            pandas DataFrame, or None if nothing was fetched
+        """
+        super().__init__(message)
+        self.partial = partial
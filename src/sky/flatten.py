@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+from typing import Union
+
+
+class Flattener:
+    def __init__(self, paths: Union[list, None] = None, sep: str = "."):
+        """Flattening plan for the records of one endpoint
+
+        The plan is a fixed list of key paths, one per output column, that is
+        reused for every page of an endpoint. Columns are built directly from
+        those paths instead of walking every record generically like
+        pd.json_normalize does. The output is the same as pd.json_normalize's,
+        columns included: only keys present in the page become columns, and
+        they're ordered like json_normalize orders them (by first appearance
+        in the page, with the values of a record before its nested objects).
+
+        Calling the flattener returns None when a page doesn't fit the plan
+        (a new key, or an object where a value was expected), so the caller can
+        fall back to pd.json_normalize. Plans aren't changed once built, which
+        makes them safe to share between threads. Flattener.extended returns a
+        new plan that also fits a page.
+
+        Args:
+            paths: Key paths of the output columns, either dotted strings
+            ("student_info.grade_level") or tuples of keys. The plan is
+            usually inferred with Flattener.infer instead
+            sep: Separator used for dotted paths and column names
+        """
+        self.sep = sep
+        # Key paths of the output columns, in column order
+        self.paths = []
+        # Keys that may appear in each nested object, by the path of the object
+        self.leaves = {(): set()}
+        self.children = {(): set()}
+        self.keys = {(): set()}
+        for path in paths or []:
+            self._addPath(tuple(path.split(sep)) if isinstance(path, str) else path)
+
+    @classmethod
+    def infer(cls, records: list, sep: str = ".") -> Union["Flattener", None]:
+        """Infer a plan from a page of records
+
+        Returns:
+            The inferred plan, or None if the records don't share one shape
+        """
+        return cls(sep=sep).extended(records)
+
+    def extended(self, records: list) -> Union["Flattener", None]:
+        """A copy of the plan with the paths of records that aren't in it yet
+
+        Returns:
+            The new plan, or None if a key is an object in one record and a
+            value in another
+        """
+        flattener = type(self)(sep=self.sep)
+        flattener.paths = list(self.paths)
+        for name in ("leaves", "children", "keys"):
+            setattr(
+                flattener,
+                name,
+                {prefix: set(keys) for prefix, keys in getattr(self, name).items()},
+            )
+        try:
+            for record in records:
+                flattener._learnRecord(record)
+        except _Conflict:
+            return None
+        return flattener
+
+    def fits(self, records: list) -> bool:
+        """Check whether a page can be flattened with the plan"""
+        return self._fits(records, (), {})
+
+    def covers(self, columns: list) -> bool:
+        """Check whether the plan has a path for each column name"""
+        return set(columns) <= {self.sep.join(path) for path in self.paths}
+
+    def __call__(self, records: list) -> Union[pd.DataFrame, None]:
+        """Flatten a page of records
+
+        Returns:
+            Pandas DataFrame with one column per path, or None if a record
+            doesn't fit the plan
+        """
+        # Keys present in at least one record, by the path of their object
+        seen = {prefix: set() for prefix in self.leaves}
+        if not self._fits(records, (), seen):
+            return None
+        columns = {}
+        for path in self.paths:
+            # Keeping columns that exist in at least one record, like json_normalize
+            if path[-1] not in seen.get(path[:-1], ()):
+                continue
+            if len(path) == 1:
+                key = path[0]
+                column = [record.get(key, np.nan) for record in records]
+            elif len(path) == 2:
+                outer, key = path
+                column = [
+                    record.get(outer, _EMPTY).get(key, np.nan) for record in records
+                ]
+            else:
+                column = [_lookup(record, path) for record in records]
+            # json_normalize would expand an object found where a value was expected
+            if dict in set(map(type, column)):
+                return None
+            columns[self.sep.join(path)] = column
+        order = {}
+        for record in records:
+            for name in self._columnNames(record, ()):
+                order.setdefault(name, None)
+            # The first records usually hold every key of the page
+            if len(order) == len(columns):
+                break
+        return pd.DataFrame(
+            {name: columns[name] for name in order}, index=pd.RangeIndex(len(records))
+        )
+
+    def _addPath(self, path: tuple) -> None:
+        """Register a column path and the objects leading to it"""
+        for i in range(1, len(path)):
+            if path[:i] not in self.leaves:
+                self._addObject(path[:i])
+        if path[-1] in self.children[path[:-1]]:
+            raise _Conflict
+        if path[-1] not in self.leaves[path[:-1]]:
+            self.leaves[path[:-1]].add(path[-1])
+            self.keys[path[:-1]].add(path[-1])
+            self.paths.append(path)
+
+    def _addObject(self, path: tuple) -> None:
+        """Register a nested object"""
+        if path[-1] in self.leaves[path[:-1]]:
+            raise _Conflict
+        self.leaves.setdefault(path, set())
+        self.children.setdefault(path, set())
+        self.keys.setdefault(path, set())
+        self.children[path[:-1]].add(path[-1])
+        self.keys[path[:-1]].add(path[-1])
+
+    def _learnRecord(self, record: dict) -> None:
+        """Learn the paths of a record, values before nested objects"""
+        nested = []
+        for key, item in record.items():
+            if isinstance(item, dict):
+                nested.append(key)
+            else:
+                self._addPath((key,))
+        for key in nested:
+            self._addObject((key,))
+            self._learn(record[key], (key,))
+
+    def _learn(self, value: dict, prefix: tuple) -> None:
+        for key, item in value.items():
+            if isinstance(item, dict):
+                self._addObject(prefix + (key,))
+                self._learn(item, prefix + (key,))
+            else:
+                self._addPath(prefix + (key,))
+
+    def _columnNames(self, value: dict, prefix: tuple):
+        """Column names of a record in pd.json_normalize's order
+
+        The values of a record come before its nested objects. Keys of nested
+        objects are kept in their own order, objects flattened depth first.
+        """
+        nested = []
+        for key, item in value.items():
+            if not isinstance(item, dict):
+                yield self.sep.join(prefix + (key,))
+            elif prefix:
+                yield from self._columnNames(item, prefix + (key,))
+            else:
+                nested.append(key)
+        for key in nested:
+            yield from self._columnNames(value[key], (key,))
+
+    def _fits(self, objects: list, prefix: tuple, seen: dict) -> bool:
+        """Check the objects at a path against the plan, one key at a time
+
+        Working on all the records of a page at once keeps the checks in C
+        (set unions and type maps) instead of a Python loop per record.
+        """
+        keys = set().union(*objects)
+        if not keys <= self.keys[prefix]:
+            return False
+        seen[prefix] = keys
+        for key in self.children[prefix] & keys:
+            items = [item[key] for item in objects if key in item]
+            if set(map(type, items)) != {dict}:
+                return False
+            if not self._fits(items, prefix + (key,), seen):
+                return False
+        return True
+
+
+class _Conflict(Exception):
+    """A key is an object in one record and a value in another"""
+
+
+_EMPTY = {}
+
+
+def _lookup(record: dict, path: tuple):
+    """Value at a key path, or NaN when a key is missing"""
+    for key in path[:-1]:
+        record = record.get(key, _EMPTY)
+    return record.get(path[-1], np.nan)
@@ -0,0 +1,304 @@
+import threading
+
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from .sky import Sky
+
+
+class EntityGraph:
+    def __init__(
+        self,
+        sky: Union[Sky, None] = None,
+        roles: Union[list, str] = ("student", "teacher"),
+    ):
+        """In-memory users, sections and enrollments with indexes on their keys
+
+        Tables are pulled once with the Sky helpers. Ids are hash indexed,
+        rows are grouped by their foreign keys (an enrollment's student and
+        section, a section's head teacher) and each enrollment's level and
+        offering type are resolved ahead of time. Lookups then only touch the
+        rows they return instead of merging or scanning whole DataFrames.
+
+        Here's an example of building and querying a graph::
+
+        from sky import EntityGraph, Sky
+
+        graph = EntityGraph(Sky()).refresh(parallel=True)
+        graph.studentSections(4738325)  # current academic sections
+        graph.studentsOf(3154032)  # students in a teacher's sections
+
+        # Later, e.g. after the nightly pull
+        graph.refresh(sections=False)
+
+        Args:
+            sky: The Sky used to pull tables. Only needed for refresh and
+            currentTerm
+            roles: Role name(s) of the users to hold, see Sky.getUsers
+        """
+        self.sky = sky
+        self.roles = [roles] if isinstance(roles, str) else list(roles)
+        self.users = pd.DataFrame()
+        self.sections = pd.DataFrame()
+        self.enrollments = pd.DataFrame()
+        self.levels = pd.DataFrame()
+        self.offeringtypes = pd.DataFrame()
+        # Indexes of the tables above, swapped as a whole by self.update
+        self._index = _Index(self.users, self.sections, self.enrollments)
+        # Active term name by offering type, see self.currentTerm
+        self._terms = {}
+        self._lock = threading.Lock()
+
+    def refresh(
+        self,
+        users: bool = True,
+        sections: bool = True,
+        enrollments: bool = True,
+        parallel: bool = False,
+    ) -> "EntityGraph":
+        """Pull tables again with the Sky helpers and rebuild the indexes
+
+        Args:
+            users: If True users are pulled with Sky.getUsers
+            sections: If True sections are pulled with Sky.getSections
+            enrollments: If True enrollments of the held students are pulled
+            with Sky.getStudentEnrollments
+            parallel: Passed on to Sky.getStudentEnrollments
+
+        Returns:
+            The graph, refreshed in place
+        """
+        tables = {}
+        if users:
+            tables["users"] = self.sky.getUsers(self.roles)
+        if sections:
+            tables["sections"] = self.sky.getSections()
+        if enrollments:
+            students = tables.get("users", self.users)
+            if "matched_roles" in students.columns:
+                students = students.loc[
+                    students.matched_roles.map(lambda roles: "Student" in roles)
+                ]
+            # None would pull the enrollments of every user
+            tables["enrollments"] = (
+                self.sky.getStudentEnrollments(students.id.tolist(), parallel=parallel)
+                if len(students)
+                else pd.DataFrame()
+            )
+        # Terms roll over, so active ones are looked up again
+        self._terms = {}
+        return self.update(
+            levels=self.sky.getLevels(),
+            offeringtypes=self.sky.getOfferingTypes(),
+            **tables,
+        )
+
+    def update(
+        self,
+        users: Union[pd.DataFrame, None] = None,
+        sections: Union[pd.DataFrame, None] = None,
+        enrollments: Union[pd.DataFrame, None] = None,
+        levels: Union[pd.DataFrame, None] = None,
+        offeringtypes: Union[pd.DataFrame, None] = None,
+    ) -> "EntityGraph":
+        """Replace tables with new pulls and rebuild the indexes
+
+        Tables can come from the Sky helpers or from a sky.mirror.Mirror.
+        Lookups running at the same time see either the old or the new tables.
+        A graph without a Sky needs levels and offeringtypes to resolve the
+        descriptions of its enrollments.
+
+        Args:
+            users: Users as returned by Sky.getUsers. Kept as is when None
+            sections: Sections as returned by Sky.getSections
+            enrollments: Enrollments as returned by Sky.getStudentEnrollments
+            levels: Levels as returned by Sky.getLevels
+            offeringtypes: Offering types as returned by Sky.getOfferingTypes
+
+        Returns:
+            The graph, updated in place
+        """
+        with self._lock:
+            if levels is not None:
+                self.levels = levels
+            if offeringtypes is not None:
+                self.offeringtypes = offeringtypes
+            # Reference tables are only needed once enrollments are held
+            if self.sky is not None and not len(self.offeringtypes):
+                self.levels = self.sky.getLevels()
+                self.offeringtypes = self.sky.getOfferingTypes()
+            if users is not None:
+                self.users = users.reset_index(drop=True)
+            if sections is not None:
+                self.sections = sections.reset_index(drop=True)
+            if enrollments is not None:
+                self.enrollments = self._resolve(enrollments.reset_index(drop=True))
+            self._index = _Index(self.users, self.sections, self.enrollments)
+        return self
+
+    def user(self, user_id: int) -> Union[pd.Series, None]:
+        """A user by id, None if the graph doesn't hold it"""
+        index = self._index
+        position = index.user(user_id)
+        return None if position < 0 else index.users.iloc[position]
+
+    def section(self, section_id: int) -> Union[pd.Series, None]:
+        """A section by id, None if the graph doesn't hold it"""
+        index = self._index
+        position = index.section(section_id)
+        return None if position < 0 else index.sections.iloc[position]
+
+    def studentEnrollments(self, user_id: int) -> pd.DataFrame:
+        """Every enrollment of a student"""
+        index = self._index
+        return index.enrollments.iloc[index.student_enrollments.get(user_id, [])]
+
+    def studentSections(
+        self,
+        user_id: int,
+        offeringType: Union[str, None] = "Academics",
+        current: bool = True,
+    ) -> pd.DataFrame:
+        """A student's enrollments of an offering type
+
+        Args:
+            user_id: Id of the student
+            offeringType: Offering type description (e.g. "Advisory"). None
+            keeps every offering type, as does a graph without the
+            offering types table
+            current: If True only enrollments of the active term are kept,
+            see self.currentTerm
+
+        Returns:
+            The student's enrollments, one row per section, with the level
+            and offering type descriptions
+        """
+        index = self._index
+        enrollments = index.enrollments.iloc[index.student_enrollments.get(user_id, [])]
+        if offeringType is None or "offering_type" not in enrollments.columns:
+            return enrollments
+        if len(enrollments):
+            enrollments = enrollments.loc[enrollments.offering_type == offeringType]
+        if current and len(enrollments):
+            term = self.currentTerm(offeringType)
+            if term is not None:
+                enrollments = enrollments.loc[enrollments.duration_name == term]
+        return enrollments
+
+    def sectionRoster(self, section_id: int) -> pd.DataFrame:
+        """The students enrolled in a section"""
+        index = self._index
+        enrollments = index.section_enrollments.get(section_id, [])
+        return index.users.iloc[np.unique(_held(index.enrollment_user[enrollments]))]
+
+    def teacherSections(self, user_id: int) -> pd.DataFrame:
+        """The sections a teacher is the head teacher of"""
+        index = self._index
+        return index.sections.iloc[index.teacher_sections.get(user_id, [])]
+
+    def studentsOf(self, user_id: int) -> pd.DataFrame:
+        """The students enrolled in any section a teacher is the head teacher of"""
+        index = self._index
+        sections = index.sections.id.iloc[index.teacher_sections.get(user_id, [])]
+        enrollments = [
+            index.section_enrollments[section]
+            for section in sections
+            if section in index.section_enrollments
+        ]
+        if not enrollments:
+            return index.users.iloc[[]]
+        users = _held(index.enrollment_user[np.concatenate(enrollments)])
+        return index.users.iloc[np.unique(users)]
+
+    def currentTerm(self, offeringType: str = "Academics") -> Union[str, None]:
+        """Name of the active term of an offering type, as in enrollments' duration_name
+
+        Looked up with Sky.getTerm once per refresh. None when there's no
+        active term or the graph has no Sky.
+        """
+        if self.sky is None:
+            return None
+        if offeringType not in self._terms:
+            active = self.sky.getTerm(offeringType=offeringType, active=True)
+            self._terms[offeringType] = active[0].split(" ")[0] if active else None
+        return self._terms[offeringType]
+
+    def _resolve(self, enrollments: pd.DataFrame) -> pd.DataFrame:
+        """Add the level and offering type descriptions of each enrollment"""
+        if len(self.levels) and "level_number" in enrollments.columns:
+            enrollments["level_description"] = enrollments.level_number.map(
+                self.levels.set_index("id")["name"]
+            )
+        if len(self.offeringtypes) and "offering_type_id" in enrollments.columns:
+            enrollments["offering_type"] = enrollments.offering_type_id.map(
+                self.offeringtypes.set_index("id")["description"]
+            )
+        return enrollments
+
+
+class _Index:
+    """Hash indexes and foreign key links of one version of the graph's tables"""
+
+    def __init__(
+        self, users: pd.DataFrame, sections: pd.DataFrame, enrollments: pd.DataFrame
+    ):
+        self.users = users
+        self.sections = sections
+        self.enrollments = enrollments
+        self.users_id, self._users = _unique(users, "id")
+        self.sections_id, self._sections = _unique(sections, "id")
+        # Row positions by foreign key
+        self.student_enrollments = _groups(enrollments, "user_id")
+        self.section_enrollments = _groups(enrollments, "id")
+        self.teacher_sections = _groups(sections, "teacher.id")
+        # Row of each enrollment's student in users, -1 when it isn't held
+        self.enrollment_user = _link(self.users_id, self._users, enrollments, "user_id")
+
+    def user(self, user_id: int) -> int:
+        return _position(self.users_id, self._users, user_id)
+
+    def section(self, section_id: int) -> int:
+        return _position(self.sections_id, self._sections, section_id)
+
+
+def _unique(data: pd.DataFrame, column: str) -> tuple:
+    """Hash index of the first row of each id
+
+    Returns:
+        A pandas Index of the ids and the row position of each of them
+    """
+    if column not in data.columns:
+        return pd.Index([]), np.array([], dtype=np.intp)
+    ids = data[column]
+    first = ~ids.duplicated().to_numpy()
+    return pd.Index(ids[first]), np.flatnonzero(first)
+
+
+def _groups(data: pd.DataFrame, column: str) -> dict:
+    """Row positions of data by the values of a column"""
+    if column not in data.columns or not len(data):
+        return {}
+    return data.groupby(column, sort=False).indices
+
+
+def _link(index: pd.Index, positions: np.ndarray, data: pd.DataFrame, column: str) -> np.ndarray:
+    """Row position of the key in each row of data, -1 when it isn't held"""
+    if column not in data.columns:
+        return np.full(len(data), -1, dtype=np.intp)
+    found = index.get_indexer(data[column])
+    return np.where(found >= 0, positions[found], -1)
+
+
+def _position(index: pd.Index, positions: np.ndarray, key) -> int:
+    """Row position of a key, -1 when it isn't held"""
+    try:
+        return int(positions[index.get_loc(key)])
+    except KeyError:
+        return -1
+
+
+def _held(positions: np.ndarray) -> np.ndarray:
+    """Drop the -1 positions of rows that aren't held"""
+    return positions[positions >= 0]
@@ -1,5 +1,19 @@
+import itertools
+import json
+import time
+
 from authlib.integrations.requests_client import OAuth2Session
-from typing import Union
+from typing import Callable, Iterator, Union
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+from .exceptions import DeadlineExceeded
+from .ratelimit import RateBudget
+from .profiling import Profiler, stage
 
 
 class BaseRequest:
@@ -10,12 +24,97 @@ class BaseRequest:
         header: dict,
         params: Union[dict, None] = None,
         data: Union[dict, None] = None,
+        budget: Union[RateBudget, None] = None,
+        retries: int = 3,
+        timeout: Union[float, None] = None,
+        observer: Union[Callable[[float, Union[int, None]], None], None] = None,
+        profiler: Union[Profiler, None] = None,
+        expires: Union[float, None] = None,
     ):
         self.client = client
         self.url = url
         self.header = header
         self.params = params
         self.data = data
+        self.budget = budget
+        self.retries = retries
+        self.timeout = timeout
+        self.observer = observer
+        self.profiler = profiler
+        # time.monotonic() of the caller's deadline, see sky.core.Deadline
+        self.expires = expires
+
+    def send(self, method: str, **kwargs):
+        with stage(self.profiler, "network"):
+            return self._send(method, **kwargs)
+
+    def _send(self, method: str, **kwargs):
+        """Send the request, retrying when the Sky API answers with a 429
+
+        With a shared rate budget a permit is taken before every attempt and a
+        429 pauses the budget for every process. Without one the request
+        sleeps for the Retry-After time. Each attempt is reported to the
+        observer, if any, with its latency and status code (None on failure).
+
+        Attempts, waits for a permit and Retry-After sleeps never run past
+        self.expires. DeadlineExceeded is raised instead of waiting when the
+        deadline would pass first.
+        """
+        send = getattr(self.client, method)
+        for attempt in range(self.retries + 1):
+            if self.budget:
+                try:
+                    self.budget.acquire(timeout=self.remaining())
+                except TimeoutError as e:
+                    raise DeadlineExceeded(
+                        f"Deadline exceeded waiting for a permit to call {self.url}"
+                    ) from e
+            timeout = self.attemptTimeout()
+            if timeout is not None:
+                kwargs["timeout"] = timeout
+            start = time.monotonic()
+            try:
+                raw = send(self.url, **kwargs)
+            except Exception:
+                self.observe(time.monotonic() - start, None)
+                raise
+            self.observe(time.monotonic() - start, raw.status_code)
+            if raw.status_code != 429 or attempt == self.retries:
+                return raw
+            wait = retryAfter(raw)
+            if self.budget:
+                # Every process backs off, even if this call can't wait that long
+                self.budget.pause(wait)
+            remaining = self.remaining()
+            if remaining is not None and wait >= remaining:
+                raise DeadlineExceeded(
+                    f"Deadline exceeded retrying {self.url} after a 429"
+                )
+            if not self.budget:
+                time.sleep(wait)
+
+    def remaining(self) -> Union[float, None]:
+        """Seconds left before self.expires, or None if there's no deadline"""
+        if self.expires is None:
+            return None
+        return max(self.expires - time.monotonic(), 0)
+
+    def attemptTimeout(self) -> Union[float, None]:
+        """Timeout of the next attempt, cut short by the deadline
+
+        Raises:
+            DeadlineExceeded: If the deadline has already passed
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return self.timeout
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded calling {self.url}")
+        return remaining if self.timeout is None else min(self.timeout, remaining)
+
+    def observe(self, latency: float, status: Union[int, None]) -> None:
+        if self.observer:
+            self.observer(latency, status)
 
     def getData(self):
         pass
@@ -33,32 +132,127 @@ class BaseRequest:
 
 class GetRequest(BaseRequest):
     def getData(self):
-        raw = self.client.get(self.url, headers=self.header, params=self.params)
-        return raw.json()
+        raw = self.send("get", headers=self.header, params=self.params)
+        with stage(self.profiler, "decode"):
+            return raw.json()
+
+    def streamData(self, path: str = "value") -> "StreamedPage":
+        """Send the request without buffering the body
+
+        Args:
+            path: Dotted path of the array of records in the response
+
+        Returns:
+            A :class:`StreamedPage` that parses the body as it's downloaded
+        """
+        raw = self.send("get", headers=self.header, params=self.params, stream=True)
+        # Letting urllib3 undo the gzip/deflate/br transfer encoding
+        raw.raw.decode_content = True
+        return StreamedPage(raw, path, self.profiler)
 
     def cleanData(self):
         pass
 
 
+class StreamedPage:
+    def __init__(self, response, path: str = "value", profiler=None):
+        """Response body parsed incrementally as it's downloaded
+
+        Records under path are yielded in chunks as soon as they're parsed,
+        so neither the raw body nor the whole list of records is held in
+        memory. Everything else in the body is available as data once the
+        chunks have been consumed. Parsing uses the optional ijson package;
+        without it the body is decoded in one go from the stream.
+
+        Args:
+            response: Response sent with stream=True
+            path: Dotted path of the array of records in the body
+            profiler: Records the parsing as the decode stage
+        """
+        self.response = response
+        self.path = path
+        self.profiler = profiler
+        # The rest of the body, set once the records have been consumed
+        self.data = None
+
+    def chunks(self, size: int = 1000) -> Iterator[list]:
+        """Yield lists of up to size records"""
+        try:
+            records = self._records() if ijson else self._buffered()
+            while True:
+                with stage(self.profiler, "decode"):
+                    chunk = list(itertools.islice(records, size))
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            self.response.close()
+
+    def _records(self) -> Iterator:
+        item = f"{self.path}.item"
+        document = ObjectBuilder()
+        record = None
+        depth = 0
+        for prefix, event, value in ijson.parse(self.response.raw, use_float=True):
+            if record is None and prefix != item:
+                document.event(event, value)
+                continue
+            if record is None:
+                if event not in ("start_map", "start_array"):
+                    # An array of plain values
+                    yield value
+                    continue
+                record = ObjectBuilder()
+            record.event(event, value)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+                if not depth:
+                    yield record.value
+                    record = None
+        self.data = getattr(document, "value", {})
+
+    def _buffered(self) -> Iterator:
+        data = json.load(self.response.raw)
+        *parents, key = self.path.split(".")
+        container = data
+        for parent in parents:
+            container = container.get(parent) if isinstance(container, dict) else None
+        records = []
+        if isinstance(container, dict) and isinstance(container.get(key), list):
+            records, container[key] = container[key], []
+        self.data = data
+        yield from records
+
+
 class PostRequest(BaseRequest):
     def getData(self):
         self.header["Content-Type"] = "application/json"
-        raw = self.client.post(self.url, headers=self.header, json=self.data)
+        raw = self.send("post", headers=self.header, json=self.data)
         return raw
 
 
 class PatchRequest(BaseRequest):
     def getData(self, **kwargs):
         self.header["Content-Type"] = "application/json"
-        raw = self.client.patch(
-            self.url, headers=self.header, params=None, data=None, json=self.data
+        raw = self.send(
+            "patch", headers=self.header, params=None, data=None, json=self.data
         )
         return raw
 
 
 class DeleteRequest(BaseRequest):
     def getData(self, **kwargs):
-        raw = self.client.delete(
-            self.url, headers=self.header, params=self.params, body=self.data, **kwargs
+        raw = self.send(
+            "delete", headers=self.header, params=self.params, body=self.data, **kwargs
         )
         return raw.text
+
+
+def retryAfter(response, default: float = 1.0) -> float:
+    """Seconds to wait before retrying, read from the Retry-After header"""
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
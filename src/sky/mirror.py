@@ -0,0 +1,471 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Union
+
+import pandas as pd
+
+from .core import Deadline
+from .ratelimit import Transaction
+from .sky import Sky
+from .utils import (
+    cleanAdvancedList,
+    endpointKey,
+    mergeHeadTeachers,
+    normalizeListPage,
+    normalizePage,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    changed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_roles (
+    base_role_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (base_role_id, id)
+);
+CREATE INDEX IF NOT EXISTS user_roles_user ON user_roles (id);
+CREATE TABLE IF NOT EXISTS enrollments (
+    user_id INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    changed REAL NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+CREATE TABLE IF NOT EXISTS sections (
+    id INTEGER PRIMARY KEY,
+    level_id INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    changed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sections_level ON sections (level_id);
+CREATE TABLE IF NOT EXISTS list_rows (
+    list_id INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    changed REAL NOT NULL,
+    PRIMARY KEY (list_id, id)
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    kind TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    synced REAL NOT NULL,
+    PRIMARY KEY (kind, scope)
+);
+"""
+
+
+class Mirror:
+    # Query parameter an endpoint takes to only return records modified after
+    # a time, keyed by the endpoint with ids written as {id} (e.g.
+    # "academics/enrollments/{id}"). None of the school endpoints mirrored here
+    # document one, so every table is diffed by content hash until an entry
+    # is added
+    modified_since = {}
+
+    def __init__(self, sky: Union[Sky, None] = None, path: str = ".sky-mirror.db"):
+        """Local SQLite mirror of users, enrollments, sections and advanced lists
+
+        Each sync pulls a table, hashes every record and only writes the
+        records that were added, changed or removed since the last sync. Reads
+        are served from the mirror without calling the Sky API, and
+        changed_since returns just the rows that changed after a given time.
+
+        Here's an example of a daily refresh::
+
+        from sky import Mirror, Sky
+
+        mirror = Mirror(Sky(), "roster.db")
+        mirror.syncUsers(["student", "teacher"])
+        mirror.syncEnrollments(parallel=True)
+        students = mirror.users("student")
+
+        Args:
+            sky: The Sky used to sync. Only needed for the sync methods
+            path: Path of the sqlite database
+        """
+        self.sky = sky
+        self.path = path
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def syncUsers(self, roles: Union[list, str] = "student") -> dict:
+        """Sync the users holding the given roles
+
+        Users that no longer hold any mirrored role are removed.
+
+        Args:
+            roles: A list (or string) of role name(s), see Sky.getUsers
+
+        Returns:
+            Dictionary with the number of inserted, updated, deleted and
+            unchanged users
+        """
+        counts = Counter()
+        for base_role_id in dict.fromkeys(self.sky.getRoleId(roles)):
+            records, delta = self._pull(
+                "users/extended", {"base_role_ids": base_role_id}, "users", base_role_id
+            )
+            rows = {record["id"]: record for record in records}
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")
+                counts.update(self._merge(db, "users", rows))
+                if not delta:
+                    db.execute(
+                        "DELETE FROM user_roles WHERE base_role_id = ?", (base_role_id,)
+                    )
+                db.executemany(
+                    "INSERT OR IGNORE INTO user_roles (base_role_id, id) VALUES (?, ?)",
+                    [(base_role_id, id) for id in rows],
+                )
+                counts["deleted"] += db.execute(
+                    "DELETE FROM users WHERE id NOT IN (SELECT id FROM user_roles)"
+                ).rowcount
+                self._synced(db, "users", base_role_id)
+        return _counts(counts)
+
+    def syncEnrollments(
+        self, students: Union[int, list, None] = None, parallel: bool = False
+    ) -> dict:
+        """Sync the enrollments of the given students
+
+        Args:
+            students: A user id or list of user ids. Defaults to the students
+            in the mirror, whose enrollments are the only ones kept
+            parallel: If True students are fetched concurrently, see
+            Sky.getStudentEnrollments
+
+        Returns:
+            Dictionary with the number of inserted, updated, deleted and
+            unchanged enrollments
+        """
+        prune = not students
+        if prune:
+            base_roles = self.sky.getRoleId("student")
+            students = self._ids(base_roles)
+        if isinstance(students, (str, int)):
+            students = [students]
+
+        def fetch(user_id):
+            return self._pull(
+                f"academics/enrollments/{user_id}", None, "enrollments", user_id
+            )
+
+        pulls = self.sky.fanOut(fetch, students, Deadline(None), parallel)
+        counts = Counter()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            for user_id, (records, delta) in zip(students, pulls):
+                rows = {
+                    str(record["id"]) if "id" in record else _hash(record): record
+                    for record in records
+                }
+                counts.update(
+                    self._merge(
+                        db,
+                        "enrollments",
+                        rows,
+                        scope=("user_id", user_id),
+                        prune=not delta,
+                    )
+                )
+                self._synced(db, "enrollments", user_id)
+            if prune:
+                counts["deleted"] += db.execute(
+                    "DELETE FROM enrollments WHERE user_id NOT IN (SELECT id FROM "
+                    f"user_roles WHERE base_role_id IN ({','.join('?' * len(base_roles))}))",
+                    base_roles,
+                ).rowcount
+        return _counts(counts)
+
+    def syncSections(self, abbv: str = None, name: str = None) -> dict:
+        """Sync the sections of the given school level(s), see Sky.getSections
+
+        Returns:
+            Dictionary with the number of inserted, updated, deleted and
+            unchanged sections
+        """
+        counts = Counter()
+        for level in self.sky.getLevels(abbv=abbv, name=name, id=True):
+            records, delta = self._pull(
+                "academics/sections", {"level_num": level}, "sections", level
+            )
+            rows = {record["id"]: record for record in records}
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")
+                counts.update(
+                    self._merge(
+                        db, "sections", rows, scope=("level_id", level), prune=not delta
+                    )
+                )
+                self._synced(db, "sections", level)
+        return _counts(counts)
+
+    def syncAdvancedList(self, list_id: int) -> dict:
+        """Sync the rows of an advanced list
+
+        Rows have no id, so identical rows are told apart by their position
+        among the duplicates.
+
+        Returns:
+            Dictionary with the number of inserted, deleted and unchanged rows
+        """
+        rows = {}
+        seen = Counter()
+        for row in self._listRows(list_id):
+            digest = _hash(row)
+            rows[f"{digest}#{seen[digest]}"] = row
+            seen[digest] += 1
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            counts = self._merge(db, "list_rows", rows, scope=("list_id", list_id))
+            db.executemany(
+                "UPDATE list_rows SET position = ? WHERE list_id = ? AND id = ?",
+                [(i, list_id, key) for i, key in enumerate(rows)],
+            )
+            self._synced(db, "list_rows", list_id)
+        return _counts(counts)
+
+    def users(
+        self,
+        roles: Union[list, str] = "student",
+        changed_since: Union[float, None] = None,
+    ) -> pd.DataFrame:
+        """Users holding the given roles, read from the mirror
+
+        Args:
+            roles: A list (or string) of role name(s)
+            changed_since: Unix time, only users that changed after it are returned
+
+        Returns:
+            Pandas DataFrame in the format of Sky.get("users/extended")
+        """
+        base_roles = list(dict.fromkeys(self.sky.getRoleId(roles)))
+        return self._read(
+            "SELECT data FROM users WHERE id IN (SELECT id FROM user_roles "
+            f"WHERE base_role_id IN ({','.join('?' * len(base_roles))}))",
+            base_roles,
+            changed_since,
+            "id",
+        )
+
+    def enrollments(
+        self,
+        students: Union[int, list, None] = None,
+        changed_since: Union[float, None] = None,
+    ) -> pd.DataFrame:
+        """Enrollments read from the mirror, see Sky.getStudentEnrollments
+
+        Args:
+            students: A user id or list of user ids. Defaults to every student
+            changed_since: Unix time, only enrollments that changed after it
+            are returned
+        """
+        if isinstance(students, (str, int)):
+            students = [students]
+        where, params = "", []
+        if students:
+            where = f" WHERE user_id IN ({','.join('?' * len(students))})"
+            params = list(students)
+        return self._read(
+            f"SELECT data, user_id FROM enrollments{where}",
+            params,
+            changed_since,
+            "user_id, id",
+        )
+
+    def sections(
+        self,
+        abbv: str = None,
+        name: str = None,
+        changed_since: Union[float, None] = None,
+    ) -> pd.DataFrame:
+        """Sections read from the mirror, in the format of Sky.getSections"""
+        levels = self.sky.getLevels(abbv=abbv, name=name, id=True)
+        sections = self._read(
+            f"SELECT data FROM sections WHERE level_id IN ({','.join('?' * len(levels))})",
+            levels,
+            changed_since,
+            "id",
+        )
+        return mergeHeadTeachers(sections) if len(sections) else sections
+
+    def advancedList(self, list_id: int) -> pd.DataFrame:
+        """Advanced list read from the mirror, in the format of Sky.getAdvancedList"""
+        with self._connect() as db:
+            rows = [
+                json.loads(data)
+                for data, in db.execute(
+                    "SELECT data FROM list_rows WHERE list_id = ? ORDER BY position",
+                    (list_id,),
+                )
+            ]
+        if not rows:
+            return pd.DataFrame()
+        return cleanAdvancedList(normalizeListPage(rows))
+
+    def lastSync(self, kind: str, scope: Union[str, int]) -> Union[float, None]:
+        """Unix time a table (users, enrollments, sections or list_rows) was
+        last synced for the given scope (base role, user, level or list id)"""
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT synced FROM syncs WHERE kind = ? AND scope = ?",
+                (kind, str(scope)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _pull(
+        self, endpoint: str, params: Union[dict, None], kind: str, scope
+    ) -> tuple:
+        """Fetch the records of a table
+
+        Returns:
+            The records and whether they're only the ones modified since the
+            last sync
+        """
+        param = self.modified_since.get(endpointKey(endpoint))
+        last = self.lastSync(kind, scope) if param else None
+        if last:
+            since = datetime.fromtimestamp(last, timezone.utc).isoformat()
+            params = dict(params or {}, **{param: since})
+        records = self.sky.getRecords(endpoint, params=params)
+        # Single records (and errors) aren't lists of records
+        if not isinstance(records, list):
+            records = []
+        return records, bool(last)
+
+    def _listRows(self, list_id: int) -> list:
+        """Fetch every row of an advanced list, see Sky.getAdvancedList"""
+        rows = []
+        # Lists are capped at 100 pages of 1000 rows
+        for page in range(1, 101):
+            val = self.sky.get(
+                endpoint=f"lists/advanced/{list_id}?page={page}", raw_data=True
+            )
+            if val is None or val["count"] == 0:
+                break
+            rows.extend(val["results"]["rows"])
+        return rows
+
+    def _merge(
+        self,
+        db: sqlite3.Connection,
+        table: str,
+        rows: dict,
+        scope=None,
+        prune: bool = True,
+    ) -> Counter:
+        """Write the rows whose hash changed
+
+        Args:
+            db: Connection with an open transaction
+            table: Table to write to
+            rows: Records by id
+            scope: (column, value) of the table slice rows belong to. Without
+            a scope nothing is deleted
+            prune: If True rows of the slice missing from rows are deleted.
+            False when rows only hold the records modified since the last sync
+
+        Returns:
+            Counter of inserted, updated, deleted and unchanged rows
+        """
+        where, args = "", ()
+        if scope:
+            where, args = f" WHERE {scope[0]} = ?", (scope[1],)
+        old = dict(db.execute(f"SELECT id, hash FROM {table}{where}", args))
+        counts = Counter()
+        now = time.time()
+        changed = []
+        for id, record in rows.items():
+            data = json.dumps(record, sort_keys=True, separators=(",", ":"))
+            digest = _digest(data)
+            previous = old.pop(id, None)
+            if previous == digest:
+                counts["unchanged"] += 1
+                continue
+            counts["inserted" if previous is None else "updated"] += 1
+            changed.append((id, digest, data))
+
+        columns = ["id", "hash", "data", "changed"]
+        values = [(id, digest, data, now) for id, digest, data in changed]
+        if scope:
+            columns.insert(0, scope[0])
+            values = [(scope[1],) + value for value in values]
+        db.executemany(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            values,
+        )
+        if scope and prune and old:
+            db.executemany(
+                f"DELETE FROM {table}{where} AND id = ?",
+                [(scope[1], id) for id in old],
+            )
+            counts["deleted"] += len(old)
+        return counts
+
+    def _read(
+        self, query: str, params: list, changed_since: Union[float, None], order: str
+    ) -> pd.DataFrame:
+        """Normalize the records returned by a query on the data column"""
+        if changed_since is not None:
+            query += " AND" if " WHERE " in query else " WHERE"
+            query += " changed > ?"
+            params = list(params) + [changed_since]
+        with self._connect() as db:
+            rows = db.execute(f"{query} ORDER BY {order}", params).fetchall()
+        if not rows:
+            return pd.DataFrame()
+        data = normalizePage([json.loads(row[0]) for row in rows])
+        # Enrollments carry the student they belong to, as in Sky.getStudentEnrollments
+        if len(rows[0]) > 1:
+            data["user_id"] = [row[1] for row in rows]
+        return data
+
+    def _ids(self, base_roles: list) -> list:
+        """Ids of the mirrored users holding the given base roles"""
+        with self._connect() as db:
+            return [
+                id
+                for id, in db.execute(
+                    "SELECT DISTINCT id FROM user_roles WHERE base_role_id IN "
+                    f"({','.join('?' * len(base_roles))}) ORDER BY id",
+                    base_roles,
+                )
+            ]
+
+    def _synced(self, db: sqlite3.Connection, kind: str, scope) -> None:
+        db.execute(
+            "INSERT OR REPLACE INTO syncs (kind, scope, synced) VALUES (?, ?, ?)",
+            (kind, str(scope), time.time()),
+        )
+
+    def _connect(self) -> Transaction:
+        """Open a connection. A new one per call keeps the mirror safe to use from threads"""
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return Transaction(db)
+
+
+def _digest(data: str) -> str:
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def _hash(record: dict) -> str:
+    """Content hash of a record, independent of key order"""
+    return _digest(json.dumps(record, sort_keys=True, separators=(",", ":")))
+
+
+def _counts(counts: Counter) -> dict:
+    return {key: counts[key] for key in ("inserted", "updated", "deleted", "unchanged")}
@@ -0,0 +1,145 @@
+import functools
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager, nullcontext
+
+STAGES = ("auth", "network", "decode", "normalize", "concat", "postprocess", "wait")
+
+
+class Profiler:
+    def __init__(self, memory: bool = True):
+        """Attributes wall time, call counts and memory to the stages of Sky calls
+
+        Stages nest: time spent in an inner stage (e.g. network inside a
+        helper's postprocess) is only counted once, for the inner stage.
+        Memory is the net change in memory traced by tracemalloc while the
+        stage ran. Stages run on worker threads are recorded as well, and
+        the time a caller spends waiting on those threads (or on a process
+        pool) is recorded as "wait", so stage times can add up to more than
+        the wall time of the block. A stage entered again from inside itself
+        (e.g. a helper calling another helper) counts as a single call.
+
+        Usually created with :meth:`sky.Sky.profile`.
+
+        Args:
+            memory: If True memory is traced with tracemalloc, which slows
+            down Python allocations while the profiler is active
+        """
+        self.memory = memory
+        self.stats = {}
+        self.started = None
+        self.elapsed = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record the time and memory of a stage"""
+        stack = self._stack()
+        if stack and stack[-1]["name"] == name:
+            # Already recording this stage
+            yield
+            return
+        now, mem = time.perf_counter(), self._traced()
+        if stack:
+            # Pausing the enclosing stage
+            self._pause(stack[-1], now, mem)
+        frame = {"name": name, "seconds": 0.0, "memory": 0, "start": now, "mem": mem}
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            now, mem = time.perf_counter(), self._traced()
+            self._pause(frame, now, mem)
+            stack.pop()
+            if stack:
+                stack[-1]["start"], stack[-1]["mem"] = now, mem
+            with self._lock:
+                stats = self.stats.setdefault(
+                    name, {"calls": 0, "seconds": 0.0, "memory": 0}
+                )
+                stats["calls"] += 1
+                stats["seconds"] += frame["seconds"]
+                stats["memory"] += frame["memory"]
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._tracing = self.memory and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        self.elapsed = time.perf_counter() - self.started
+        if self._tracing:
+            tracemalloc.stop()
+
+    def report(self) -> dict:
+        """Machine readable report
+
+        Returns:
+            Dictionary with the total wall time and, for each stage, the
+            number of calls, seconds and net bytes allocated
+        """
+        elapsed = self.elapsed
+        if elapsed is None and self.started is not None:
+            elapsed = time.perf_counter() - self.started
+        with self._lock:
+            stages = {
+                name: dict(self.stats[name])
+                for name in sorted(self.stats, key=_stageOrder)
+            }
+        return {"total_seconds": elapsed, "stages": stages}
+
+    def table(self) -> str:
+        """Readable report, one row per stage"""
+        report = self.report()
+        total = report["total_seconds"] or 0
+        rows = [f"{'stage':<12} {'calls':>7} {'seconds':>9} {'% wall':>7} {'memory MiB':>11}"]
+        for name, stats in report["stages"].items():
+            share = stats["seconds"] / total if total else 0
+            memory = f"{stats['memory'] / 2**20:11.1f}" if self.memory else f"{'-':>11}"
+            rows.append(
+                f"{name:<12} {stats['calls']:>7} {stats['seconds']:>9.3f} {share:>7.1%} {memory}"
+            )
+        rows.append(f"{'total':<12} {'':>7} {total:>9.3f}")
+        return "\n".join(rows)
+
+    def __str__(self) -> str:
+        return self.table()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _pause(self, frame: dict, now: float, mem: int) -> None:
+        frame["seconds"] += now - frame["start"]
+        frame["memory"] += mem - frame["mem"]
+
+    def _traced(self) -> int:
+        return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+
+def stage(profiler, name: str):
+    """The profiler's stage context manager, or a no-op without a profiler"""
+    return profiler.stage(name) if profiler else nullcontext()
+
+
+def profiled(name: str):
+    """Decorator that records a Sky method as the given stage"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrap(self, *args, **kwargs):
+            with stage(self.profiler, name):
+                return func(self, *args, **kwargs)
+
+        return wrap
+
+    return decorator
+
+
+def _stageOrder(name: str):
+    return (STAGES.index(name) if name in STAGES else len(STAGES), name)
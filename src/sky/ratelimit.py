@@ -0,0 +1,143 @@
+import sqlite3
+import time
+
+from typing import Union
+
+
+class RateBudget:
+    def __init__(
+        self,
+        path: str = ".sky-budget",
+        rate: float = 10,
+        capacity: Union[float, None] = None,
+        name: str = "sky",
+    ):
+        """Request budget shared by every process on a host
+
+        A token bucket stored in a sqlite database. Each process that creates a
+        :class:`RateBudget` with the same path and name draws permits from the
+        same bucket, and sqlite's write lock keeps the bookkeeping consistent
+        across processes and threads.
+
+        Here's an example of sharing a budget between workers::
+
+        from sky import Sky, RateBudget
+
+        # Every worker process points at the same file
+        sky = Sky(rate_budget=RateBudget("/tmp/sky-budget", rate=10))
+
+        Args:
+            path: Path of the sqlite database holding the bucket
+            rate: Permits added to the bucket per second
+            capacity: Largest number of permits that can be saved up for a
+            burst. Defaults to rate, and to 1 when rate is below 1
+            name: Name of the bucket, so one database can hold several budgets
+
+        Raises:
+            ValueError: If rate isn't positive or capacity is below 1, since
+            the bucket could never hold a whole permit
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.name = name
+        with self._connect() as db:
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS budget (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    paused_until REAL NOT NULL DEFAULT 0
+                )"""
+            )
+            db.execute(
+                "INSERT OR IGNORE INTO budget (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, self.capacity, time.time()),
+            )
+
+    def acquire(self, timeout: Union[float, None] = None) -> None:
+        """Block until a request permit is available and take it
+
+        Args:
+            timeout: Most seconds to wait for a permit. None waits as long as
+            it takes
+
+        Raises:
+            TimeoutError: If no permit can be taken within timeout
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            if end is not None and time.monotonic() + wait > end:
+                raise TimeoutError("Timed out waiting for a request permit")
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out permits to every process for the given time
+
+        Used when the Sky API answers with a 429 so the whole host backs off
+        instead of each process retrying on its own.
+        """
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "UPDATE budget SET paused_until = MAX(paused_until, ?), tokens = 0 "
+                "WHERE name = ?",
+                (time.time() + seconds, self.name),
+            )
+
+    def _take(self) -> float:
+        """Take a permit if one is available
+
+        Returns:
+            0 if a permit was taken, otherwise the seconds to wait before trying again
+        """
+        with self._connect() as db:
+            # Holding the write lock for the whole read-modify-write
+            db.execute("BEGIN IMMEDIATE")
+            tokens, updated, paused_until = db.execute(
+                "SELECT tokens, updated, paused_until FROM budget WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            now = time.time()
+            if now < paused_until:
+                return paused_until - now
+            tokens = min(self.capacity, tokens + (now - max(updated, paused_until)) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            db.execute(
+                "UPDATE budget SET tokens = ?, updated = ? WHERE name = ?",
+                (tokens, now, self.name),
+            )
+            return wait
+
+    def _connect(self) -> "Transaction":
+        """Open a connection. A new one per call keeps the budget safe to use from threads"""
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return Transaction(db)
+
+
+class Transaction:
+    """Context manager that commits (or rolls back) and closes a connection"""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
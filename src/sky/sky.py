@@ -1,52 +1,46 @@
-import re
-import os
-import pickle
+import multiprocessing
+import threading
+import time
 
-
-from .utils import *
-from .httpRequest import *
-from logging import warn, warning
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import ExitStack
+from typing import Callable
 
 
-class Sky:
-    def __init__(
-        self,
-        api_key: Union[str, None] = None,
-        file_path: str = "sky_credentials.json",
-        token_path: Union[str, None] = None,
-        credentials: dict = None,
-    ):
+from .utils import *
+from .core import Deadline, SkyCore, authorize, oauthSession
+from .checkpoint import Checkpoint
+from .flatten import Flattener
+from .exceptions import DeadlineExceeded
+from .profiling import profiled, stage
+from .snapshot import Snapshot
+from requests.exceptions import Timeout
+from urllib3.exceptions import ReadTimeoutError
+from logging import warn
+from urllib.parse import urlencode
+
+# Reference tables saved by Sky.snapshot, terms are saved for every offering type
+REFERENCE_TABLES = ("roles", "levels", "offeringtypes")
+# A snapshot token is reused as is while it has at least this many seconds left
+TOKEN_MARGIN = 300
+
+
+class Sky(SkyCore):
+    def __init__(self, *args, **kwargs):
         """Blackbaud Sky API client
 
-        This class uses a :class:`authlib.integrations.requests_client.OAuth2Session` for
-        calls to the Blackbaud Sky API.
-
+        Extends :class:`sky.core.SkyCore` with helpers that return pandas
+        DataFrames. Takes the same arguments as SkyCore.
         """
-        self.token = None
-        self.client = None
-        self.file_path = file_path
-        self.credentials = credentials
-
-        # Seeing if the user saved the api key as an environment variable
-        if os.getenv("BB_API_KEY"):
-            self.api_key = os.getenv("BB_API_KEY")
-        elif api_key:
-            self.api_key = api_key
-        else:
-            warn(
-                """
-            A api key is needed to call the Blackbaud sky api. You can either initialize it when calling
-            the Sky class or you can save it in a environment variable called BB_API_KEY
-            """
-            )
-
-        # Path to cached token
-        if token_path:
-            self.token_path = token_path
-        elif os.getenv("BB_TOKEN_PATH"):
-            self.token_path = os.getenv("BB_TOKEN_PATH")
-        else:
-            self.token_path = ".sky-token"
+        super().__init__(*args, **kwargs)
+        # Reference tables by endpoint, see self._getReference
+        self.reference = {}
+        # Time each reference table was fetched
+        self.reference_fetched = {}
+        # Flattening plans of the endpoints called so far, see sky.flatten.Flattener
+        self.flatteners = {}
+        self._flatteners_lock = threading.Lock()
 
     @authorize
     def get(
@@ -55,6 +49,16 @@ class Sky:
         params: Union[dict, None] = None,
         reference: str = "school",
         raw_data: bool = False,
+        prefetch: bool = False,
+        processes: Union[int, Executor, None] = None,
+        fields: Union[list, None] = None,
+        exclude: Union[list, None] = None,
+        compact: Union[bool, str] = False,
+        checkpoint: Union[str, None] = None,
+        compiled: bool = True,
+        deadline: Union[float, None] = None,
+        stream: bool = False,
+        sink: Union[Callable[[pd.DataFrame], None], None] = None,
     ) -> Union[dict, pd.DataFrame, dict, None]:
         """Get request to the Sky API
         Args:
@@ -63,141 +67,238 @@ class Sky:
             reference: Which SKY Api refrence are you calling. See them here
             https://developer.blackbaud.com/skyapi/apis
             endpoint: The specific endpioint that exist in the given api reference
+            prefetch: If True the next page of a paginated response is fetched
+            on a background thread while the current page is normalized
+            processes: Number of worker processes used to normalize pages, or
+            an executor (e.g. a ProcessPoolExecutor kept for many calls) to
+            submit them to. Pages are normalized in the calling thread when None
+            fields: Dotted paths of the fields to keep, e.g. ["id", "email",
+            "student_info.grade_level"]. Other fields are never normalized
+            exclude: Dotted paths of the fields to drop before normalization
+            compact: If True the DataFrame is converted to memory efficient
+            dtypes with utils.compactFrame. "arrow" also stores the remaining
+            strings with the Arrow backed dtype (requires pyarrow)
+            checkpoint: Path of a file used to save the pages of a paginated
+            pull as they arrive. If the pull is interrupted, calling get again
+            with the same arguments resumes from the last saved page
+            compiled: If True pages are flattened with the endpoint's plan in
+            self.flatteners, inferred from the first page when missing. Set to
+            False to always use pd.json_normalize
+            deadline: Seconds the whole call may take. Once it passes no more
+            pages are requested and sky.exceptions.DeadlineExceeded is raised
+            with the pages fetched so far as its partial attribute
+            stream: If True response bodies aren't buffered. Records are parsed
+            as they're downloaded (incrementally with the optional ijson
+            package) and normalized in chunks. Prefetch has no effect and
+            checkpoint isn't supported when streaming
+            sink: Called with the DataFrame of each page, in order, as soon as
+            it's normalized (e.g. to append it to a file). Pages aren't kept,
+            so get returns None and compact is applied page by page. On a
+            deadline every page fetched in time goes to sink first
         Returns:
            Dictionary with data from the sky api
         """
+        if stream and checkpoint:
+            raise ValueError("checkpoint can't be used with stream")
+        stream = stream and not raw_data
+        clock = Deadline(deadline)
         url = self._get_url(reference, endpoint)
-        df = pd.DataFrame()
-        while True:
-            # Calling API
-            apiCall = GetRequest(self.client, url, self.request_header, params=params)
-            data = apiCall.getData()
-            self._saveToken(apiCall.updateToken(self.token))
-            # Checking if user wants the raw dictionary
-            if raw_data:
-                return data
-            if not data.get("value"):
-                # Still returning df for single user endpoints
-                if data:
-                    if data.get("status") == 404 or data.get("errors"):
-                        warn("ERROR: Invalid request")
-                        return data
-                    return pd.json_normalize(data)
-                return None
-            df = pd.concat([df, pd.json_normalize(data["value"])], ignore_index=True)
-            # Checking for another link
-            if not data.get("next_link"):
-                return df
-            # Saving the next link
-            link = data["next_link"]
-            # Finding the endpoint value
-            end = re.search("v[\\d]/", link).end(0)
-            url = self._get_url(reference, link[end:])
-
-    @authorize
-    def post(
-        self,
-        data: dict,
-        reference: str = "school",
-        endpoint: str = "users",
-    ) -> dict:
-        """Post request to the Sky API
-        Args:
-            data: Dictionary that defines the request data to be passed to
-            the api in order to create a new record
-            reference: Which SKY Api refrence are you calling. See them here
-            https://developer.blackbaud.com/skyapi/apis
-            endpoint: The specific endpioint that exist in the given api reference
-        Returns:
-           Dictionary with data from the sky api
-        """
-        url = self._get_url(reference, endpoint)
-
-        apiCall = PostRequest(self.client, url, self.request_header, data=data)
-
-        data = apiCall.getData()
-        self._saveToken(apiCall.updateToken(self.token))
-        return data
-
-    @authorize
-    def patch(
-        self,
-        reference: str = "school",
-        endpoint: str = "users",
-        params: Union[dict, None] = None,
-        body: Union[dict, None] = None,
-        data: Union[dict, None] = None,
-        **kwargs,
-    ) -> dict:
-        """Patch requests to the Sky API
-        Args:
-            data: Dictionary that defines the request data to be passed to
-            the api in order to create a new record
-            reference: Which SKY Api refrence are you calling. See them here
-            https://developer.blackbaud.com/skyapi/apis
-            endpoint: The specific endpioint that exist in the given api reference
-        Returns:
-           Dictionary with data from the sky api
-        """
-        url = self._get_url(reference, endpoint)
-
-        apiCall = PatchRequest(
-            self.client, url, self.request_header, params=params, data=data
-        )
-
-        data = apiCall.getData(**kwargs)
-        self._saveToken(apiCall.updateToken(self.token))
-        return data
+        # Normalized pages (or futures of them) in the order they were fetched
+        frames = []
+        store = Checkpoint(checkpoint, (url, params)) if checkpoint else None
+        saved = []
+        if store and not raw_data:
+            resume_url, saved = store.load()
+            url = resume_url or url
+        with ExitStack() as stack:
+            # Only one page can be in flight since each next_link comes from the page before it
+            executor = (
+                stack.enter_context(ThreadPoolExecutor(max_workers=1))
+                if prefetch and not stream
+                else None
+            )
+            pool = self._processPool(stack, processes)
+
+            def normalize(records: list):
+                with stage(self.profiler, "normalize"):
+                    flattener = (
+                        self._flattener(endpoint, records) if compiled else None
+                    )
+                    if pool:
+                        return pool.submit(
+                            normalizePage, records, fields, exclude, flattener
+                        )
+                    df = normalizePage(records, fields, exclude, flattener)
+                    # Pages that didn't fit went through pd.json_normalize
+                    if flattener is not None and not flattener.covers(df.columns):
+                        self._learn(endpoint, records)
+                    return df
+
+            def flush(wait: bool = False) -> None:
+                """Hand the pages normalized so far to sink, in order"""
+                while frames and (
+                    wait or not isinstance(frames[0], Future) or frames[0].done()
+                ):
+                    df = self._concat([frames.pop(0)])
+                    sink(self._compact(df, compact) if compact else df)
+
+            def finish() -> Union[pd.DataFrame, None]:
+                if sink:
+                    flush(wait=True)
+                    df = None
+                else:
+                    df = self._concat(frames)
+                if store:
+                    store.clear()
+                return self._compact(df, compact) if compact and df is not None else df
+
+            for records in saved:
+                frames.append(normalize(records))
+            if saved and resume_url is None:
+                # The last page was saved but the pull stopped before clearing it
+                return finish()
+
+            def timedOut() -> DeadlineExceeded:
+                if sink:
+                    flush(wait=True)
+                df = self._concat(frames) if frames else None
+                if df is not None and compact:
+                    df = self._compact(df, compact)
+                return DeadlineExceeded(
+                    f"Deadline exceeded calling {endpoint}", partial=df
+                )
 
-    @authorize
-    def delete(
+            pending = None
+            try:
+                while True:
+                    if clock.expired():
+                        raise timedOut()
+                    # Calling API (or collecting the page fetched in the background)
+                    streamed = []
+                    try:
+                        if pending:
+                            with stage(self.profiler, "wait"):
+                                data = pending.result(timeout=clock.remaining())
+                            pending = None
+                        elif stream:
+                            page = self._streamPage(url, params, clock)
+                            streamed = [normalize(chunk) for chunk in page.chunks()]
+                            data = page.data
+                        else:
+                            data = self._getPage(url, params, clock)
+                    except DeadlineExceeded as e:
+                        # A retry or rate limit wait would have run past the deadline
+                        raise timedOut() from e
+                    except (Timeout, ReadTimeoutError, FutureTimeout) as e:
+                        if clock.expired():
+                            raise timedOut() from e
+                        raise
+                    # Checking if user wants the raw dictionary
+                    if raw_data:
+                        return data
+                    if not data.get("value") and not streamed:
+                        # Still returning df for single user endpoints
+                        if data:
+                            if data.get("status") == 404 or data.get("errors"):
+                                warn("ERROR: Invalid request")
+                                return data
+                            df = pd.json_normalize(
+                                pruneRecords(data, fields=fields, exclude=exclude)
+                            )
+                            df = self._compact(df, compact) if compact else df
+                            return sink(df) if sink else df
+                        return None
+                    # Requesting the next page before normalizing the current one
+                    if data.get("next_link"):
+                        url = self._nextUrl(reference, data["next_link"])
+                        if executor:
+                            pending = executor.submit(self._getPage, url, params, clock)
+                    if store:
+                        store.addPage(
+                            data["value"], url if data.get("next_link") else None
+                        )
+                    if stream:
+                        frames.extend(streamed)
+                    else:
+                        frames.append(normalize(data["value"]))
+                    if sink:
+                        flush()
+                    # Checking for another link
+                    if not data.get("next_link"):
+                        return finish()
+            finally:
+                if pending:
+                    pending.cancel()
+
+    @profiled("postprocess")
+    def getUsers(
         self,
-        reference: str = "school",
-        endpoint: str = "roles",
-        params: Union[dict, None] = None,
-        data: Union[dict, None] = None,
-        **kwargs,
-    ) -> dict:
-        """Delete requests to the sky API
-
-        Args:
-            reference: Which SKY Api refrence are you calling. See them here
-            https://developer.blackbaud.com/skyapi/apis
-            endpoint: The specific endpioint that exist in the given api reference
-            **kwargs: ... Honestly don't know yet. Never used this endpoint. Just
-            adding for testing
-        Returns:
-           Dictionary with data from the sky api
-        """
-        url = self._get_url(reference, endpoint)
-
-        apiCall = DeleteRequest(
-            self.client, url, self.request_header, params=params, data=data
-        )
-
-        data = apiCall.getData(**kwargs)
-        self._saveToken(apiCall.updateToken(self.token))
-        return data
-
-    def getUsers(self, roles: Union[list, str] = "student") -> pd.DataFrame:
+        roles: Union[list, str] = "student",
+        fields: Union[list, None] = None,
+        exclude: Union[list, None] = None,
+        compact: Union[bool, str] = False,
+        deadline: Union[float, None] = None,
+    ) -> pd.DataFrame:
         """Get a DataFrame of users from the Core database
 
         Args:
             roles: A list (or string) of role name(s) from your Blackbaud
             Core database
+            fields: Dotted paths of the user fields to keep, passed to self.get
+            exclude: Dotted paths of the user fields to drop, passed to self.get
+            compact: If True the DataFrame is converted to memory efficient
+            dtypes with utils.compactFrame. "arrow" also stores the remaining
+            strings with the Arrow backed dtype (requires pyarrow)
+            deadline: Seconds the whole call may take, see self.get
         Returns:
-            Pandas dataframe of users details
+            Pandas dataframe of users details, one row per user. Roles are
+            pulled in parallel by base role, so matched_roles lists every
+            requested role name sharing a base role the user was pulled for,
+            not necessarily the roles the user holds
         """
-        roles = self.getRoleId(roles)
-        users = pd.DataFrame()
-        for role in roles:
-            user_df = self.get(
-                endpoint="users/extended", params={"base_role_ids": role}
-            )
-            if isinstance(user_df, pd.DataFrame):
-                users = pd.concat([users, user_df], ignore_index=True)
-        return users
+        clock = Deadline(deadline)
+        if isinstance(roles, str):
+            roles = [roles]
+        # Each role should have Title case to match Blackbaud
+        roles = [role.title() for role in roles]
+        role_table = self._getReference("roles")
+        role_table = role_table.loc[role_table.name.isin(roles)]
+        # Role names by base role, so each base role is only pulled once
+        base_roles = role_table.groupby("base_role_id", sort=False).name.agg(list)
+
+        def fetch(base_role_id):
+            def matched(user_df):
+                if isinstance(user_df, pd.DataFrame):
+                    names = base_roles[base_role_id]
+                    return user_df.assign(matched_roles=[names] * len(user_df))
+
+            try:
+                user_df = self.get(
+                    endpoint="users/extended",
+                    params={"base_role_ids": base_role_id},
+                    fields=fields,
+                    exclude=exclude,
+                    deadline=clock.remaining(),
+                )
+            except DeadlineExceeded as e:
+                raise DeadlineExceeded(str(e), partial=matched(e.partial)) from e
+            return matched(user_df)
 
+        try:
+            frames = self.fanOut(
+                fetch, base_roles.index.tolist(), clock, parallel=len(base_roles) > 1
+            )
+        except DeadlineExceeded as e:
+            raise self._timedOut(e, e.partial, compact) from e
+        with stage(self.profiler, "concat"):
+            users = partialFrame(frames)
+        if users is None:
+            return pd.DataFrame()
+        users = dedupeUsers(users)
+        # Compacting once all roles are combined so categories line up
+        return self._compact(users, compact) if compact else users
+
+    @profiled("postprocess")
     def getRoleId(self, roles: Union[list, str], base: bool = True) -> int:
         """Get the Blackbaud id of a role in the Core database
 
@@ -212,15 +313,15 @@ class Sky:
         if isinstance(roles, str):
             roles = [roles]
         # Each role should have Title case to match Blackbaud
-        for i in range(len(roles)):
-            roles[i] = roles[i].title()
-        role_id = self.get("roles")
+        roles = [role.title() for role in roles]
+        role_id = self._getReference("roles")
         role_id = role_id.loc[role_id.name.isin(roles)]
         # Returning the base
         if base:
             return role_id.base_role_id.tolist()
         return role_id.id.tolist()
 
+    @profiled("postprocess")
     def getLevels(
         self, abbv: str = None, name: str = None, id: bool = False
     ) -> Union[pd.DataFrame, list, int]:
@@ -236,7 +337,7 @@ class Sky:
             given level's id
         """
         # Calling sky to get levels
-        levels = self.get("levels")
+        levels = self._getReference("levels")
         # Filtering
         if abbv:
             levels = levels.loc[
@@ -252,10 +353,22 @@ class Sky:
             return levels.id.values.tolist()
         return levels
 
+    @profiled("postprocess")
+    def getOfferingTypes(self) -> pd.DataFrame:
+        """Gets the offering types (e.g. Academics, Advisory) from Core database
+
+        Returns:
+            A df of the offering types with their id and description, fetched
+            once per Sky instance
+        """
+        return self._getReference("offeringtypes")
+
+    @profiled("postprocess")
     def getSections(
         self,
         abbv: str = None,
         name: str = None,
+        deadline: Union[float, None] = None,
     ) -> pd.DataFrame:
         """Gets the sections in the users Core database
 
@@ -264,50 +377,60 @@ class Sky:
             to be passed into self.getLevels
             name: Name of a given school level in the Core db to be passed
              into self.getLevels
+            deadline: Seconds the whole call may take, see self.get. The
+            partial results are the sections before the teachers are merged
 
         Returns:
             Dataframe with data from sections in the Core Db
         """
-
+        clock = Deadline(deadline)
         course_levels = self.getLevels(name=name, abbv=abbv, id=True)
 
         df = pd.DataFrame()
 
         # Passing level_ids to the Sky API
         for level in course_levels:
+            try:
+                sections = self.get(
+                    endpoint="academics/sections",
+                    params={"level_num": level},
+                    deadline=clock.remaining(),
+                )
+            except DeadlineExceeded as e:
+                raise self._timedOut(e, [df, e.partial]) from e
             # Appending data to the df
-            df = pd.concat(
-                [
-                    df,
-                    self.get(
-                        endpoint="academics/sections", params={"level_num": level}
-                    ),
-                ],
-                ignore_index=True,
-            )
-
-        # Cleaning the teacher data for each section
-        teacher_data = (
-            df.explode("teachers")["teachers"]
-            .apply(pd.Series)
-            .query("head == True")
-            .add_prefix("teacher.")
-            .drop("teacher.0", axis=1)
-        )
+            with stage(self.profiler, "concat"):
+                df = pd.concat([df, sections], ignore_index=True)
 
-        # Merging sections with the teachers
-        df = (
-            df.merge(teacher_data, left_index=True, right_index=True)
-            .reset_index(drop=True)
-            .drop("teachers", axis=1)
-        )
+        return mergeHeadTeachers(df)
 
-        return df
+    @profiled("postprocess")
+    def getStudentEnrollments(
+        self,
+        students: Union[int, list] = None,
+        fields: Union[list, None] = None,
+        exclude: Union[list, None] = None,
+        compact: Union[bool, str] = False,
+        deadline: Union[float, None] = None,
+        parallel: bool = False,
+    ) -> pd.DataFrame:
+        """Returns a DataFrame of all current student enrollments
 
-    def getStudentEnrollments(self, students: Union[int, list] = None) -> pd.DataFrame:
-        """Returns a DataFrame of all current student enrollments"""
+        Args:
+            students: A user id or list of user ids. Defaults to every student
+            fields: Dotted paths of the enrollment fields to keep, passed to self.get
+            exclude: Dotted paths of the enrollment fields to drop, passed to self.get
+            compact: If True the DataFrame is converted to memory efficient
+            dtypes with utils.compactFrame. "arrow" also stores the remaining
+            strings with the Arrow backed dtype (requires pyarrow)
+            deadline: Seconds the whole call may take, see self.get
+            parallel: If True students are fetched concurrently, with the
+            number of requests in flight set by self.concurrency
+        """
+        clock = Deadline(deadline)
         if not students:
-            students = self.getUsers()
+            # Only the ids are needed so the rest of the user record is skipped
+            students = self.getUsers(fields=["id"], deadline=clock.remaining())
             students = students.id.tolist()
         if isinstance(students, (str, int)):
             students = [students]
@@ -316,16 +439,34 @@ class Sky:
                 "Value of students must either be a user id or list of user ids"
             )
 
-        enrollment = pd.DataFrame()
-        for user_id in students:
-            student_enrollment = self.get(f"academics/enrollments/{user_id}")
-            if isinstance(student_enrollment, pd.DataFrame):
-                student_enrollment = student_enrollment.assign(user_id=user_id)
-                enrollment = pd.concat(
-                    [enrollment, student_enrollment], ignore_index=True
+        def fetch(user_id):
+            try:
+                student_enrollment = self.get(
+                    f"academics/enrollments/{user_id}",
+                    fields=fields,
+                    exclude=exclude,
+                    deadline=clock.remaining(),
                 )
-        return enrollment
-
+            except DeadlineExceeded as e:
+                if isinstance(e.partial, pd.DataFrame):
+                    raise DeadlineExceeded(
+                        str(e), partial=e.partial.assign(user_id=user_id)
+                    ) from e
+                raise
+            if isinstance(student_enrollment, pd.DataFrame):
+                return student_enrollment.assign(user_id=user_id)
+
+        try:
+            frames = self.fanOut(fetch, students, clock, parallel)
+        except DeadlineExceeded as e:
+            raise self._timedOut(e, e.partial, compact) from e
+        with stage(self.profiler, "concat"):
+            enrollment = partialFrame(frames)
+        if enrollment is None:
+            enrollment = pd.DataFrame()
+        return self._compact(enrollment, compact) if compact else enrollment
+
+    @profiled("postprocess")
     def enrollmentMedley(
         self,
     ) -> dict:
@@ -341,7 +482,7 @@ class Sky:
         )
 
         # Saving offerings db once instead of calling for each id
-        offerings = self.get("offeringtypes")
+        offerings = self.getOfferingTypes()
 
         # Filtering enrollments for advisory and academic enrollments
         academic_enrollments = enrollments.loc[
@@ -444,6 +585,7 @@ class Sky:
 
         return enrollment_dict
 
+    @profiled("postprocess")
     def getTerm(
         self, offeringType: str = "Academics", active=False
     ) -> Union[pd.DataFrame, list, str]:
@@ -457,7 +599,7 @@ class Sky:
         """
         params = {"offering_type": self.getOfferingId(offeringType)[0]}
 
-        data = self.get("terms", params=params)[
+        data = self._getReference("terms", params)[
             ["id", "level_description", "description", "begin_date", "end_date"]
         ]
 
@@ -479,18 +621,38 @@ class Sky:
             return active_terms_list
         return active_terms
 
+    @profiled("postprocess")
     def getOfferingId(self, offeringType: Union[str, list] = "Academics") -> list:
         """Gets the id of a Core offering type"""
         if isinstance(offeringType, str):
             offeringType = [offeringType]
-        data = self.get("offeringtypes")
+        data = self.getOfferingTypes()
         return data.loc[data.description.isin(offeringType), "id"].tolist()
 
-    def getAdvancedList(self, list_id: int) -> pd.DataFrame:
+    @profiled("postprocess")
+    def getAdvancedList(
+        self,
+        list_id: int,
+        processes: Union[int, Executor, None] = None,
+        checkpoint: Union[str, None] = None,
+        deadline: Union[float, None] = None,
+        parallel: bool = False,
+        stream: bool = False,
+    ) -> pd.DataFrame:
         """Gets Advanced list from Core
 
         Args:
             list_id: The sld of an advanced list in Core
+            processes: Number of worker processes used to normalize pages, or
+            an executor (e.g. a ProcessPoolExecutor kept for many calls) to
+            submit them to. Pages are normalized in the calling thread when None
+            checkpoint: Path of a file used to save pages as they arrive so an
+            interrupted call resumes from the last saved page
+            deadline: Seconds the whole call may take, see self.get
+            parallel: If True pages are fetched concurrently in batches sized
+            by the current limit of self.concurrency
+            stream: If True rows are parsed as pages are downloaded and
+            normalized in chunks, see self.get. Can't be used with checkpoint
 
         Returns:
             A pandas dataframe of the advanced list
@@ -503,55 +665,246 @@ class Sky:
         #     print("Fail")
         # Type casting the data to a dataframe
 
+        if stream and checkpoint:
+            raise ValueError("checkpoint can't be used with stream")
+        clock = Deadline(deadline)
         # A list to hold all dataframes for queries longer than 1000 rows
         main = []
-        
-        # Run through ~100 pages, which will equate to 100,000 rows max
-        for i in range(1, 101):
-            val = self.get(endpoint=f"lists/advanced/{list_id}?page={i}", raw_data=True)
-
-            if val['count'] == 0:
-                break
-            else:
+        store = Checkpoint(checkpoint, ("lists/advanced", list_id)) if checkpoint else None
+        start, saved = store.load() if store else (None, [])
+
+        with ExitStack() as stack:
+            pool = self._processPool(stack, processes)
+            for rows in saved:
                 main.append(
-                    pd.json_normalize(val["results"]["rows"], "columns").reset_index()
+                    pool.submit(normalizeListPage, rows)
+                    if pool
+                    else normalizeListPage(rows)
+                )
+
+            def fetch(page: int) -> dict:
+                if stream:
+                    if clock.expired():
+                        raise DeadlineExceeded("Deadline exceeded calling lists/advanced")
+                    try:
+                        streamed = self._streamPage(
+                            self._get_url("school", f"lists/advanced/{list_id}?page={page}"),
+                            clock=clock,
+                            path="results.rows",
+                        )
+                        frames = [normalizeListPage(rows) for rows in streamed.chunks()]
+                    except (Timeout, ReadTimeoutError) as e:
+                        # The body may still be downloading when the deadline passes
+                        if clock.expired():
+                            raise DeadlineExceeded(
+                                "Deadline exceeded calling lists/advanced"
+                            ) from e
+                        raise
+                    # The rows were consumed while streaming, keeping their frames instead
+                    return dict(streamed.data, frames=frames)
+                return self.get(
+                    endpoint=f"lists/advanced/{list_id}?page={page}",
+                    raw_data=True,
+                    deadline=clock.remaining(),
                 )
 
-        # If there's only one dataframe, return it
-        if len(main) < 2:
-            return cleanAdvancedList(main[0])
-        # Concat the list of dataframes together
-        else:
-            data = pd.concat(main, ignore_index=True)
-            return cleanAdvancedList(data)
-
-    def _loadCachedToken(self) -> Union[None, OAuth2Token]:
-        """Load Sky API token from cache"""
-        # Loading token from binary file
-        if os.path.exists(self.token_path):
-            with open(self.token_path, "rb") as token:
-                self.token = pickle.load(token)
-        return self.token
-
-    def _get_url(self, reference: str, endpoint: str) -> str:
-        """Format api requests url
+            def add(page: int, val: dict) -> bool:
+                """Keep a page, returns False once the list has run out of pages"""
+                if val is None or val["count"] == 0:
+                    return False
+                if store:
+                    store.addPage(val["results"]["rows"], page + 1)
+                if "frames" in val:
+                    main.extend(val["frames"])
+                elif pool:
+                    main.append(pool.submit(normalizeListPage, val["results"]["rows"]))
+                else:
+                    main.append(normalizeListPage(val["results"]["rows"]))
+                return True
+
+            # Run through ~100 pages, which will equate to 100,000 rows max
+            page = start or 1
+            more = True
+            while more and page <= 100:
+                size = max(int(self.concurrency.limit), 1) if parallel else 1
+                batch = list(range(page, min(page + size, 101)))
+                try:
+                    vals = self.fanOut(fetch, batch, clock, parallel)
+                except DeadlineExceeded as e:
+                    # Keeping the pages fetched in order before the deadline
+                    for i, val in zip(batch, e.partial):
+                        if not add(i, val):
+                            break
+                    partial = cleanAdvancedList(self._concat(main)) if main else None
+                    raise DeadlineExceeded(str(e), partial=partial) from e
+                for i, val in zip(batch, vals):
+                    more = add(i, val)
+                    if not more:
+                        break
+                page += size
+
+            if store:
+                store.clear()
+            # Concat the list of dataframes together
+            return cleanAdvancedList(self._concat(main))
+
+    @authorize
+    def snapshot(self, path: str = ".sky-snapshot") -> str:
+        """Save the auth state and reference tables for a warm start
+
+        Here's an example of warming up workers::
+
+        # Once, e.g. in a deploy step or a scheduled job
+        Sky().snapshot("/srv/sky/.sky-snapshot")
+
+        # In every new worker, no token refresh or reference calls needed
+        sky = Sky.from_snapshot("/srv/sky/.sky-snapshot")
+
+        Args:
+            path: Path of the snapshot file. It holds the api token and client
+            secret, so keep it as private as the token cache
+
+        Returns:
+            The path of the snapshot
+        """
+        # Fetching the reference tables the helpers use
+        for endpoint in REFERENCE_TABLES:
+            self._getReference(endpoint)
+        for offering_type in self._getReference("offeringtypes")["id"].tolist():
+            self._getReference("terms", {"offering_type": offering_type})
+
+        # The refreshed token doesn't carry the client credentials
+        token = dict(self.token, **self.client.token)
+        Snapshot(path).dump(
+            getattr(self, "api_key", None),
+            token,
+            self.reference,
+            self.reference_fetched,
+        )
+        return path
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        path: str = ".sky-snapshot",
+        max_age: Union[float, None] = 86400,
+        **kwargs,
+    ) -> "Sky":
+        """Create a Sky from a file written by Sky.snapshot
+
+        The saved client is used right away while its access token is valid,
+        otherwise it's refreshed on the first call as usual. Reference tables
+        older than max_age are dropped and fetched again when needed.
 
         Args:
-            reference:
-            endpoint:
+            path: Path of the snapshot file
+            max_age: Seconds a saved reference table stays fresh. None keeps
+            them regardless of age
+            kwargs: Passed on to Sky, api_key defaults to the saved one
 
         Returns:
-            API url to call
+            A Sky with the saved token and fresh reference tables
+
+        Raises:
+            ValueError: If the file isn't a snapshot of this version
+        """
+        state = Snapshot(path).load()
+        if state["api_key"]:
+            kwargs.setdefault("api_key", state["api_key"])
+        sky = cls(**kwargs)
+
+        now = time.time()
+        for key, (fetched, table) in state["reference"].items():
+            if max_age is None or now - fetched <= max_age:
+                sky.reference[key] = table
+                sky.reference_fetched[key] = fetched
+
+        # Reusing the access token while it's valid
+        sky.token = state["token"]
+        if sky.token.get("expires_at", 0) - now > TOKEN_MARGIN:
+            sky.client = oauthSession(sky.token)
+        return sky
+
+    def _flattener(self, endpoint: str, records: list) -> Union[Flattener, None]:
+        """Get the flattening plan of an endpoint, inferring it from records if needed"""
+        key = self._planKey(endpoint)
+        if key not in self.flatteners:
+            with self._flatteners_lock:
+                if key not in self.flatteners:
+                    self.flatteners[key] = Flattener.infer(records)
+        return self.flatteners[key]
+
+    def _learn(self, endpoint: str, records: list) -> None:
+        """Replace the plan of an endpoint with one that also fits records
+
+        Plans are swapped rather than changed, so pages being flattened on
+        other threads keep a consistent plan.
+        """
+        key = self._planKey(endpoint)
+        with self._flatteners_lock:
+            plan = self.flatteners.get(key)
+            if plan is not None and not plan.fits(records):
+                # Keeping the old plan when the page conflicts with it
+                self.flatteners[key] = plan.extended(records) or plan
+
+    def _planKey(self, endpoint: str) -> str:
+        # Ids in the path (e.g. academics/enrollments/{user_id}) share a plan
+        return endpointKey(endpoint)
+
+    def _processPool(
+        self, stack: ExitStack, processes: Union[int, Executor, None]
+    ) -> Union[Executor, None]:
+        """Executor that normalizes pages, see the processes argument of self.get
+
+        Pools created here start their workers with forkserver (spawn where
+        it's not available). Forking would copy this process while the
+        prefetch thread or a fan-out is in the middle of a request.
+        """
+        if not processes:
+            return None
+        if isinstance(processes, Executor):
+            return processes
+        methods = multiprocessing.get_all_start_methods()
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        return stack.enter_context(
+            ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context(method)
+            )
+        )
+
+    def _concat(self, frames: list) -> pd.DataFrame:
+        """Concatenate pages, waiting for any still being normalized in a process pool"""
+        with stage(self.profiler, "wait"):
+            frames = [f.result() if isinstance(f, Future) else f for f in frames]
+        with stage(self.profiler, "concat"):
+            return concatPages(frames)
+
+    def _compact(
+        self, df: pd.DataFrame, compact: Union[bool, str] = True
+    ) -> pd.DataFrame:
+        with stage(self.profiler, "postprocess"):
+            return compactFrame(df, arrow_strings=compact == "arrow")
+
+    def _getReference(
+        self, endpoint: str, params: Union[dict, None] = None
+    ) -> pd.DataFrame:
+        """Get a small reference table (e.g. roles), fetching it once per Sky instance
+
+        Cached tables are kept in self.reference, clear it to fetch them again.
         """
-        return f"https://api.sky.blackbaud.com/{reference}/v1/{endpoint}"
-
-    def _saveToken(self, token: OAuth2Token) -> None:
-        """Save OAuth2Token for future use"""
-        with open(self.token_path, "wb") as f:
-            pickle.dump(token, f)
-        self.token = token
-
-    @property
-    def request_header(self):
-        """API key to pass to Request header"""
-        return {"Bb-Api-Subscription-Key": self.api_key}
+        key = endpoint
+        if params:
+            key += "?" + urlencode(sorted(params.items()))
+        if key not in self.reference:
+            self.reference[key] = self.get(endpoint, params=params)
+            self.reference_fetched[key] = time.time()
+        return self.reference[key].copy()
+
+    def _timedOut(
+        self, error: DeadlineExceeded, frames: list, compact: Union[bool, str] = False
+    ) -> DeadlineExceeded:
+        """Combine the partial results of a helper that ran past its deadline"""
+        partial = partialFrame(frames)
+        if partial is not None and compact:
+            partial = self._compact(partial, compact)
+        return DeadlineExceeded(str(error), partial=partial)
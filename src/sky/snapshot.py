@@ -0,0 +1,88 @@
+import gzip
+import os
+import pickle
+import tempfile
+import time
+
+from typing import Union
+
+# Bumped whenever the layout of the snapshot changes
+VERSION = 1
+
+
+class Snapshot:
+    def __init__(self, path: str = ".sky-snapshot"):
+        """Warm-start file with the auth state and reference tables of a Sky
+
+        The state is pickled and gzipped into one file together with a format
+        version and the time each part was saved, so a new process can check
+        what's still fresh before reusing it.
+
+        Args:
+            path: Path of the snapshot file
+        """
+        self.path = path
+
+    def dump(
+        self,
+        api_key: Union[str, None],
+        token: dict,
+        reference: dict,
+        fetched: dict,
+    ) -> None:
+        """Write the snapshot, replacing the file atomically
+
+        The file holds the api token and client secret, so it's only readable
+        by its owner.
+
+        Args:
+            api_key: Subscription key of the Sky instance
+            token: OAuth2 token including client_id and client_secret
+            reference: Reference tables by key, see Sky._getReference
+            fetched: Time each reference table was fetched
+        """
+        state = {
+            "version": VERSION,
+            "created": time.time(),
+            "api_key": api_key,
+            "token": dict(token),
+            "reference": {
+                key: (fetched.get(key, time.time()), table)
+                for key, table in reference.items()
+            },
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # mkstemp creates the file with 0600 permissions
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                pickle.dump(state, gz, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def load(self) -> dict:
+        """Read the snapshot
+
+        Returns:
+            Dictionary with the version, created, api_key, token and reference
+            keys. Reference maps each table's key to (fetched, table)
+
+        Raises:
+            ValueError: If the file isn't a snapshot of this version
+        """
+        try:
+            with gzip.open(self.path, "rb") as gz:
+                state = pickle.load(gz)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            if isinstance(e, FileNotFoundError):
+                raise
+            raise ValueError(f"{self.path} is not a Sky snapshot") from e
+        version = state.get("version") if isinstance(state, dict) else None
+        if version != VERSION:
+            raise ValueError(
+                f"{self.path} was written by an incompatible version of sky "
+                f"(snapshot version {version}, expected {VERSION})"
+            )
+        return state
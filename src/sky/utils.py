@@ -1,75 +1,17 @@
+import importlib.util
+import re
+
+import numpy as np
 import pandas as pd
 import pytz
 
 
-from .auth import AuthApp, OAuth2Token
-from authlib.integrations.requests_client import OAuth2Session
+from .flatten import Flattener
+from concurrent.futures import Future
 from typing import Union
 from datetime import datetime
 
 
-def authorize(func):
-    """Load OAuth2Session
-
-    A :class:`authlib.integrations.requests_client.OAuth2Session ` is needed in order to
-    call the sky api and save api tokens.
-
-    loadClient first attempts to load a token from the users cache but if there's no token
-    available it will automatically launch a local web server in order to authenticate you
-    with the Sky API
-    """
-
-    def wrap(*args, **kwargs):
-        # Assing the sky instance
-        skyObject = args[0]
-
-        # Chcking if theres a client existant
-        if not skyObject.client:
-            # Chccking if the user already has a token caced
-            if not skyObject._loadCachedToken():
-                authorizationApp(skyObject)
-            # Initalizing the client class
-            skyObject.client = OAuth2Session(
-                token=skyObject.token,
-                client_id=skyObject.token["client_id"],
-                client_secret=skyObject.token["client_secret"],
-                token_endpoint="https://oauth2.sky.blackbaud.com/token",
-                token_endpoint_auth_method="client_secret_basic",
-                preserve_refresh_token=True,
-            )
-            # Updating access token and preserving refresh token
-            skyObject.client.refresh_token(
-                "https://oauth2.sky.blackbaud.com/token", preserve_refresh_token=True
-            )
-        # Running the call function
-        return func(*args, **kwargs)
-
-    return wrap
-
-
-def authorizationApp(skyObject) -> None:
-    """Launch server to retrieve Sky API token"""
-    # Checking if the user passed in a valid dictionary with their credentials
-    if skyObject.credentials and isinstance(skyObject.credentials, dict):
-        valid_credentials = (
-            skyObject.credentials.get("client_id")
-            and skyObject.credentials.get("client_secret")
-            and skyObject.credentials.get("redirect_uri")
-        )
-        if valid_credentials:
-            app = AuthApp.load_credentials(skyObject.credentials)
-        else:
-            # If the credentials aren't valid then passing in the path to sky_credentials.json
-            app = AuthApp.load_credentials(skyObject.file_path)
-    else:
-        # If the user didn't pass in a dict then passing in the path to sky_credentials.json
-        app = AuthApp.load_credentials(skyObject.file_path)
-    # Launching a local server
-    skyObject.token = app.run_local_server()
-    # Saving the new api token
-    skyObject._saveToken(skyObject.token)
-
-
 def cleanAdvancedList(data: pd.DataFrame) -> pd.DataFrame:
     """Cleans data from the legacy/list Sky API endpoint
     Args:
@@ -78,17 +20,10 @@ def cleanAdvancedList(data: pd.DataFrame) -> pd.DataFrame:
     Returns:
         Pandas DataFrame with data from a Core Advanced List
     """
-    # Initializing empty array to store index data
-    index = []
     # Number of columns in the data
     ncol = len(data.name.unique())
-    # Initializing index value
-    num = 0
-
-    for i in range(len(data)):
-        if (i % ncol) == 0:
-            num += 1
-        index.append(num)
+    # Each run of ncol rows belongs to the same list row
+    index = np.arange(len(data)) // ncol + 1
 
     # Setting the index values
     data["index"] = index
@@ -98,6 +33,244 @@ def cleanAdvancedList(data: pd.DataFrame) -> pd.DataFrame:
     return data
 
 
+def normalizePage(
+    records: list,
+    fields: Union[list, None] = None,
+    exclude: Union[list, None] = None,
+    flattener: Union[Flattener, None] = None,
+) -> pd.DataFrame:
+    """Normalizes the records of a single page returned by the Sky API
+
+    Defined at module level so pages can be shipped to a process pool.
+
+    Args:
+        records: The "value" list of a Sky API response
+        fields: Dotted paths of the fields to keep, see pruneRecords
+        exclude: Dotted paths of the fields to drop, see pruneRecords
+        flattener: Flattening plan of the endpoint. Pages that don't fit the
+        plan are normalized with pd.json_normalize
+
+    Returns:
+        Pandas DataFrame with one row per record
+    """
+    records = pruneRecords(records, fields=fields, exclude=exclude)
+    if flattener:
+        df = flattener(records)
+        if df is not None:
+            return df
+    return pd.json_normalize(records)
+
+
+def pruneRecords(
+    records: Union[list, dict],
+    fields: Union[list, None] = None,
+    exclude: Union[list, None] = None,
+) -> Union[list, dict]:
+    """Removes unwanted fields from raw Sky API records before normalization
+
+    Paths are dotted like the columns returned by pd.json_normalize, e.g.
+    "student_info.grade_level" keeps (or drops) just that key of the
+    student_info object. Lists of objects are pruned element by element.
+
+    Args:
+        records: A record or list of records from a Sky API response
+        fields: Dotted paths of the fields to keep. Everything is kept when None
+        exclude: Dotted paths of the fields to drop
+
+    Returns:
+        The pruned record(s). The input is left untouched
+    """
+    if fields:
+        records = _keepPaths(records, _pathTree(fields))
+    if exclude:
+        records = _dropPaths(records, _pathTree(exclude))
+    return records
+
+
+def _pathTree(paths: list) -> dict:
+    """Turns dotted paths into a nested dict, an empty dict marks a whole subtree"""
+    tree = {}
+    for path in paths:
+        node = tree
+        keys = path.split(".")
+        for i, key in enumerate(keys):
+            # A shorter path already covers this whole subtree
+            if key in node and not node[key]:
+                break
+            if i == len(keys) - 1:
+                node[key] = {}
+            else:
+                node = node.setdefault(key, {})
+    return tree
+
+
+def _keepPaths(value, tree: dict):
+    """Keeps only the keys in tree"""
+    if isinstance(value, list):
+        return [_keepPaths(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: _keepPaths(value[key], sub) if sub else value[key]
+        for key, sub in tree.items()
+        if key in value
+    }
+
+
+def _dropPaths(value, tree: dict):
+    """Drops the leaf keys in tree"""
+    if isinstance(value, list):
+        return [_dropPaths(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: _dropPaths(item, tree[key]) if key in tree else item
+        for key, item in value.items()
+        if key not in tree or tree[key]
+    }
+
+
+def endpointKey(endpoint: str) -> str:
+    """Path of an endpoint without its query string and with ids replaced by {id}
+
+    e.g. "academics/enrollments/{id}" for "academics/enrollments/4738325?page=2",
+    so every id of an endpoint shares one entry in per-endpoint settings.
+    """
+    return re.sub("/\\d+(?=/|$)", "/{id}", endpoint.split("?")[0])
+
+
+def normalizeListPage(rows: list) -> pd.DataFrame:
+    """Normalizes the rows of a single page of a Core Advanced List
+
+    Args:
+        rows: The "results.rows" list of a lists/advanced response
+
+    Returns:
+        Pandas DataFrame in the long format expected by cleanAdvancedList
+    """
+    return pd.json_normalize(rows, "columns").reset_index()
+
+
+def concatPages(frames: list) -> pd.DataFrame:
+    """Concatenates normalized pages in the order they were requested
+
+    Args:
+        frames: DataFrames, or futures resolving to DataFrames, one per page
+
+    Returns:
+        A single Pandas DataFrame with a fresh index
+    """
+    frames = [f.result() if isinstance(f, Future) else f for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def compactFrame(
+    data: pd.DataFrame, arrow_strings: bool = False, category_ratio: float = 0.5
+) -> pd.DataFrame:
+    """Converts a DataFrame returned by the Sky API to memory efficient dtypes
+
+    Low cardinality string columns (role names, grade levels, block names...)
+    become categoricals, float columns that only hold whole numbers (ids upcast
+    because of NaNs) become nullable integers and numeric columns are downcast
+    when no precision is lost.
+
+    Args:
+        data: DataFrame returned from the Sky API
+        arrow_strings: If True the remaining string columns use the Arrow
+        backed string dtype. Falls back to the python string dtype when
+        pyarrow isn't installed
+        category_ratio: Largest share of unique values for a string column
+        to be stored as a categorical
+
+    Returns:
+        A new DataFrame with compact dtypes
+    """
+    string_dtype = "string[pyarrow]" if _hasPyarrow() else "string"
+    data = data.copy()
+    for i in range(data.shape[1]):
+        col = data.iloc[:, i]
+        kind = pd.api.types.infer_dtype(col, skipna=True)
+        if kind == "string":
+            if col.nunique() <= category_ratio * len(col):
+                col = col.astype("category")
+            elif arrow_strings:
+                col = col.astype(string_dtype)
+        elif kind == "floating" and _isWholeNumber(col):
+            col = pd.to_numeric(col.astype("Int64"), downcast="integer")
+        elif kind == "integer":
+            col = pd.to_numeric(col, downcast="integer")
+        elif kind == "floating":
+            downcast = col.astype("float32")
+            if downcast.astype(col.dtype).equals(col):
+                col = downcast
+        data.isetitem(i, col)
+    return data
+
+
+def _isWholeNumber(col: pd.Series) -> bool:
+    """True if every non null value of a float column is a whole number"""
+    values = col.dropna()
+    return bool(len(values)) and bool((values == values.round()).all())
+
+
+def _hasPyarrow() -> bool:
+    """True if the optional pyarrow dependency is installed"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def partialFrame(frames: list) -> Union[pd.DataFrame, None]:
+    """Concatenates the DataFrames fetched before a deadline, skipping missing ones"""
+    frames = [f for f in frames if isinstance(f, pd.DataFrame)]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def mergeHeadTeachers(sections: pd.DataFrame) -> pd.DataFrame:
+    """Replaces the teachers column of sections with the head teacher's details
+
+    Args:
+        sections: Sections returned by the academics/sections endpoint
+
+    Returns:
+        The sections with the head teacher in teacher. prefixed columns
+    """
+    # Cleaning the teacher data for each section
+    teacher_data = (
+        sections.explode("teachers")["teachers"]
+        .apply(pd.Series)
+        .query("head == True")
+        .add_prefix("teacher.")
+        .drop("teacher.0", axis=1, errors="ignore")
+    )
+
+    # Merging sections with the teachers
+    return (
+        sections.merge(teacher_data, left_index=True, right_index=True)
+        .reset_index(drop=True)
+        .drop("teachers", axis=1)
+    )
+
+
+def dedupeUsers(users: pd.DataFrame) -> pd.DataFrame:
+    """Keeps one row per user id, combining the roles each row was matched on
+
+    Args:
+        users: Users pulled for several roles, with a matched_roles column
+        holding a list of role names on each row
+
+    Returns:
+        The first row of each user with the matched_roles of all its rows.
+        Users are left as is when there's no id column (e.g. fields excluded it)
+    """
+    if "id" not in users.columns:
+        return users
+    matched = users.groupby("id", sort=False).matched_roles.agg(
+        lambda roles: list(dict.fromkeys(role for names in roles for role in names))
+    )
+    users = users.drop_duplicates("id").reset_index(drop=True)
+    users["matched_roles"] = users["id"].map(matched)
+    return users
+
+
 def isActiveTerm(data: pd.DataFrame) -> pd.DataFrame:
     """Takes
 
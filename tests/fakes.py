@@ -0,0 +1,70 @@
+"""Offline stand-ins for the Sky API, used by the tests that don't need credentials"""
+import io
+import json
+import os
+
+from sky import Sky
+
+
+class FakeResponse:
+    def __init__(self, data=None, status_code: int = 200, headers: dict = None):
+        self.data = data
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = json.dumps(data)
+        # Body read by stream=True requests
+        self.raw = io.BytesIO(self.text.encode())
+        self.closed = False
+
+    def json(self):
+        return self.data
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, pages):
+        """OAuth2Session that answers every request with pages(url, params)
+
+        pages returns the body of the response as a dict, or a FakeResponse
+        for other status codes and headers. Requests are kept in calls.
+        """
+        self.pages = pages
+        self.calls = []
+        self.token = {"client_id": "id", "client_secret": "secret", "access_token": "token"}
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        self.calls.append((url, params))
+        response = self.pages(url, params)
+        if isinstance(response, FakeResponse):
+            return response
+        return FakeResponse(response)
+
+    post = patch = delete = get
+
+
+def fakeSky(pages, directory: str, **kwargs) -> Sky:
+    """A Sky that's already authorized and talks to a FakeClient"""
+    sky = Sky(api_key="key", token_path=os.path.join(directory, ".sky-token"), **kwargs)
+    sky.client = FakeClient(pages)
+    sky.token = dict(sky.client.token)
+    return sky
+
+
+def pagedRecords(records: list, per_page: int, endpoint: str = "users/extended"):
+    """pages function serving records per_page at a time with next_link"""
+
+    def pages(url, params):
+        page = int(url.split("page=")[1]) if "page=" in url else 0
+        data = {
+            "count": len(records),
+            "value": records[page * per_page:(page + 1) * per_page],
+        }
+        if (page + 1) * per_page < len(records):
+            data["next_link"] = (
+                f"https://api.sky.blackbaud.com/school/v1/{endpoint}?page={page + 1}"
+            )
+        return data
+
+    return pages
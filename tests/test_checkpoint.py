@@ -0,0 +1,87 @@
+import os
+import tempfile
+
+from unittest import TestCase
+
+from sky.checkpoint import Checkpoint
+from fakes import fakeSky, pagedRecords
+
+USERS = [{"id": i, "name": f"u{i}"} for i in range(7)]
+URL = "https://api.sky.blackbaud.com/school/v1/users/extended"
+
+
+def listPage(page: int, pages: int = 3) -> dict:
+    """Page of an advanced list with two columns per row"""
+    rows = []
+    if page <= pages:
+        rows = [
+            {"columns": [{"name": "id", "value": f"{page}{i}"}, {"name": "x", "value": i}]}
+            for i in range(2)
+        ]
+    return {"count": len(rows), "results": {"rows": rows}}
+
+
+class TestCheckpoint(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "pull")
+
+    def failing(self, pages, fail: str):
+        """pages that raise once on the first url containing fail"""
+        failed = []
+
+        def wrapped(url, params):
+            if fail in url and not failed:
+                failed.append(url)
+                raise ConnectionError("Connection reset")
+            return pages(url, params)
+
+        return wrapped
+
+    def test_get_resumes_after_failure(self):
+        sky = fakeSky(self.failing(pagedRecords(USERS, 3), "page=1"), self.directory)
+        with self.assertRaises(ConnectionError):
+            sky.get("users/extended", checkpoint=self.path)
+        sky.client.calls.clear()
+
+        users = sky.get("users/extended", checkpoint=self.path)
+        self.assertEqual(users.id.tolist(), list(range(7)))
+        # Page 0 came from the checkpoint
+        self.assertEqual([url for url, _ in sky.client.calls], [f"{URL}?page=1", f"{URL}?page=2"])
+        self.assertEqual(Checkpoint(self.path, (URL, None)).load(), (None, []))
+
+    def test_get_finishes_saved_pull(self):
+        # The run stopped after saving the last page but before clearing the checkpoint
+        store = Checkpoint(self.path, (URL, None))
+        store.addPage(USERS[:3], f"{URL}?page=1")
+        store.addPage(USERS[3:], None)
+        sky = fakeSky(pagedRecords(USERS, 3), self.directory)
+
+        users = sky.get("users/extended", checkpoint=self.path)
+        self.assertEqual(users.id.tolist(), list(range(7)))
+        self.assertEqual(sky.client.calls, [])
+        self.assertEqual(store.load(), (None, []))
+
+    def test_checkpoint_of_another_pull_is_ignored(self):
+        Checkpoint(self.path, (URL, {"base_role_ids": 3})).addPage(USERS[:3], f"{URL}?page=1")
+        sky = fakeSky(pagedRecords(USERS, 3), self.directory)
+        users = sky.get("users/extended", checkpoint=self.path)
+        self.assertEqual(users.id.tolist(), list(range(7)))
+        self.assertEqual(len(sky.client.calls), 3)
+
+    def test_advanced_list_resumes_after_failure(self):
+        def pages(url, params):
+            return listPage(int(url.split("page=")[1]))
+
+        sky = fakeSky(self.failing(pages, "page=2"), self.directory)
+        with self.assertRaises(ConnectionError):
+            sky.getAdvancedList(1, checkpoint=self.path)
+        sky.client.calls.clear()
+
+        data = sky.getAdvancedList(1, checkpoint=self.path)
+        self.assertEqual(data.id.tolist(), ["10", "11", "20", "21", "30", "31"])
+        requested = [url.split("page=")[1] for url, _ in sky.client.calls]
+        self.assertEqual(requested, ["2", "3", "4"])
+        self.assertEqual(Checkpoint(self.path, ("lists/advanced", 1)).load(), (None, []))
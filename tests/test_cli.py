@@ -0,0 +1,62 @@
+import importlib.util
+import os
+import tempfile
+
+import pandas as pd
+
+from unittest import TestCase, skipUnless
+
+from sky.cli import PageWriter, runJob
+from fakes import fakeSky, pagedRecords
+
+PAGES = [
+    pd.DataFrame({"id": [1, 2], "name": ["a", "b"]}),
+    pd.DataFrame({"id": [3], "name": ["c"], "email": ["c@x.org"]}),
+    pd.DataFrame({"id": [4], "email": [None]}),
+]
+
+
+class TestCli(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def written(self, fmt: str) -> pd.DataFrame:
+        writer = PageWriter(os.path.join(self.directory, f"out.{fmt}"), fmt)
+        for page in PAGES:
+            writer.write(page)
+        writer.close()
+        self.assertEqual(writer.rows, 4)
+        if fmt == "csv":
+            return pd.read_csv(writer.path)
+        if fmt == "jsonl":
+            return pd.read_json(writer.path, lines=True)
+        return pd.read_parquet(writer.path)
+
+    def assertCombined(self, data: pd.DataFrame):
+        self.assertEqual(data.columns.tolist(), ["id", "name", "email"])
+        self.assertEqual(data.id.tolist(), [1, 2, 3, 4])
+        self.assertEqual(data.email.notna().tolist(), [False, False, True, False])
+
+    def test_csv_pages_with_new_columns(self):
+        self.assertCombined(self.written("csv"))
+
+    def test_jsonl_pages_with_new_columns(self):
+        self.assertCombined(self.written("jsonl"))
+
+    @skipUnless(importlib.util.find_spec("pyarrow"), "requires pyarrow")
+    def test_parquet_pages_with_new_columns(self):
+        self.assertCombined(self.written("parquet"))
+
+    def test_get_job_is_written_page_by_page(self):
+        records = [{"id": i, "name": f"u{i}"} for i in range(5)]
+        sky = fakeSky(pagedRecords(records, 2), self.directory)
+        sizes = []
+        writer = PageWriter(os.path.join(self.directory, "users.csv"), "csv")
+        write = writer.write
+        writer.write = lambda df: sizes.append(len(df)) or write(df)
+
+        runJob(sky, "get:users/extended", writer)
+        self.assertEqual(sizes, [2, 2, 1])
+        self.assertEqual(pd.read_csv(writer.path).id.tolist(), list(range(5)))
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from unittest import TestCase
+
+from sky.concurrency import AdaptiveConcurrency
+
+
+class TestAdaptiveConcurrency(TestCase):
+    def test_additive_increase(self):
+        concurrency = AdaptiveConcurrency(initial=4, maximum=6)
+        # About one more slot for every limit successful requests
+        for _ in range(4):
+            concurrency.record(0.1, 200)
+        self.assertAlmostEqual(concurrency.limit, 5, delta=0.1)
+        for _ in range(100):
+            concurrency.record(0.1, 200)
+        self.assertEqual(concurrency.limit, 6)
+        self.assertEqual(concurrency.metrics()["successes"], 104)
+
+    def test_cut_on_throttling_and_errors(self):
+        for status in (429, 500, 503, None):
+            with self.subTest(status=status):
+                concurrency = AdaptiveConcurrency(initial=8)
+                concurrency.record(0.1, status)
+                self.assertEqual(concurrency.limit, 4)
+
+    def test_cut_on_latency_spike(self):
+        concurrency = AdaptiveConcurrency(initial=8)
+        concurrency.record(0.1, 200)
+        concurrency.record(1.0, 200)
+        self.assertLess(concurrency.limit, 8)
+
+    def test_cooldown(self):
+        concurrency = AdaptiveConcurrency(initial=8, minimum=1)
+        # A burst of 429s from one round of requests only counts once
+        for _ in range(4):
+            concurrency.record(0.1, 429)
+        self.assertEqual(concurrency.limit, 4)
+        self.assertEqual(concurrency.metrics()["throttled"], 4)
+        # Once a round of requests has completed the next 429 cuts again
+        concurrency.record(0.1, 429)
+        self.assertEqual(concurrency.limit, 2)
+        concurrency.record(0.1, 429)
+        self.assertEqual(concurrency.limit, 2)
+
+    def test_slots_are_limited(self):
+        concurrency = AdaptiveConcurrency(initial=2)
+        peak = []
+        lock = threading.Lock()
+
+        def task():
+            with concurrency.slot():
+                with lock:
+                    peak.append(concurrency.in_flight)
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=task) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(peak), 2)
+        with concurrency.slot(), concurrency.slot():
+            with self.assertRaises(TimeoutError):
+                with concurrency.slot(timeout=0.05):
+                    pass
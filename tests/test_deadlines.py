@@ -0,0 +1,58 @@
+import tempfile
+import time
+
+from unittest import TestCase
+
+from sky import RateBudget
+from sky.exceptions import DeadlineExceeded
+from fakes import FakeResponse, fakeSky, pagedRecords
+
+
+def throttled(url, params):
+    return FakeResponse({}, status_code=429, headers={"Retry-After": "3"})
+
+
+class TestDeadlines(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def assertRaisesQuickly(self, call, seconds: float = 1.0) -> DeadlineExceeded:
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded) as raised:
+            call()
+        self.assertLess(time.monotonic() - start, seconds)
+        return raised.exception
+
+    def test_retry_after_past_deadline(self):
+        sky = fakeSky(throttled, self.directory)
+        self.assertRaisesQuickly(lambda: sky.get("users/extended", deadline=1))
+        error = self.assertRaisesQuickly(
+            lambda: sky.getRecords("users/extended", deadline=1)
+        )
+        self.assertEqual(error.partial, [])
+
+    def test_rate_budget_wait_past_deadline(self):
+        budget = RateBudget(f"{self.directory}/budget", rate=10)
+        budget.pause(3)
+        sky = fakeSky(pagedRecords([{"id": 1}], 1), self.directory, rate_budget=budget)
+        self.assertRaisesQuickly(lambda: sky.get("users/extended", deadline=1))
+        self.assertEqual(sky.client.calls, [])
+
+    def test_retries_within_deadline(self):
+        responses = [
+            FakeResponse({}, status_code=429, headers={"Retry-After": "0.1"}),
+            {"count": 1, "value": [{"id": 1}]},
+        ]
+        sky = fakeSky(lambda url, params: responses.pop(0), self.directory)
+        self.assertEqual(sky.get("users/extended", deadline=5).id.tolist(), [1])
+
+    def test_partial_pages(self):
+        pages = pagedRecords([{"id": i} for i in range(4)], 2)
+        responses = iter([pages, throttled])
+        sky = fakeSky(lambda url, params: next(responses)(url, params), self.directory)
+        error = self.assertRaisesQuickly(
+            lambda: sky.get("users/extended", deadline=1)
+        )
+        self.assertEqual(error.partial.id.tolist(), [0, 1])
@@ -0,0 +1,100 @@
+import tempfile
+
+import pandas as pd
+
+from unittest import TestCase
+
+from sky import Flattener
+from fakes import fakeSky
+
+# Pages of users/extended with the shapes flattening plans have to handle
+PAGES = [
+    # Keys listed in a different order than json_normalize's columns
+    [
+        {"id": 1, "info": {"grade": 9, "house": "N"}, "name": "a"},
+        {"name": "b", "id": 2, "info": {"house": "S", "grade": 10}},
+    ],
+    # Keys missing in some records
+    [
+        {"id": 3, "name": "c"},
+        {"id": 4, "info": {"grade": 11}},
+    ],
+    # Empty objects
+    [
+        {"id": 5, "name": "e", "info": {}},
+        {"id": 6, "name": "f", "info": {"grade": 12, "advisor": {}}},
+    ],
+    # None where other records have an object
+    [
+        {"id": 7, "name": "g", "info": None},
+        {"id": 8, "name": "h", "info": {"grade": 9}},
+    ],
+    # New keys on a later page
+    [
+        {"id": 9, "name": "i", "email": "i@x.org", "info": {"grade": 10, "locker": 12}},
+    ],
+    # An object where the plan has a value
+    [
+        {"id": 10, "name": {"first": "j"}},
+    ],
+]
+
+
+def pages(url, params):
+    page = int(url.split("page=")[1]) if "page=" in url else 0
+    data = {"count": len(PAGES[page]), "value": PAGES[page]}
+    if page + 1 < len(PAGES):
+        data["next_link"] = (
+            f"https://api.sky.blackbaud.com/school/v1/users/extended?page={page + 1}"
+        )
+    return data
+
+
+class TestFlatten(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_matches_json_normalize(self):
+        for page in PAGES[:3] + [PAGES[4]]:
+            with self.subTest(page=page):
+                pd.testing.assert_frame_equal(
+                    Flattener.infer(page)(page), pd.json_normalize(page)
+                )
+
+    def test_falls_back_on_objects_where_values_were_seen(self):
+        # json_normalize keeps both the info column and info.grade here
+        self.assertIsNone(Flattener.infer(PAGES[3]))
+        plan = Flattener.infer(PAGES[0])
+        self.assertIsNone(plan(PAGES[3]))
+        self.assertIsNone(Flattener.infer(PAGES[5] + [{"id": 11, "name": "k"}]))
+
+    def test_column_order_follows_the_page(self):
+        plan = Flattener.infer(PAGES[0])
+        page = [{"info": {"house": "E"}, "name": "k", "id": 11}, {"id": 12, "info": {"grade": 9}}]
+        pd.testing.assert_frame_equal(plan(page), pd.json_normalize(page))
+
+    def test_later_page_with_new_keys(self):
+        plan = Flattener.infer(PAGES[0])
+        self.assertIsNone(plan(PAGES[4]))
+        extended = plan.extended(PAGES[4])
+        pd.testing.assert_frame_equal(extended(PAGES[4]), pd.json_normalize(PAGES[4]))
+        pd.testing.assert_frame_equal(extended(PAGES[0]), pd.json_normalize(PAGES[0]))
+        # The original plan is left as it was
+        self.assertIsNone(plan(PAGES[4]))
+
+    def test_get_compiled_matches_json_normalize(self):
+        expected = pd.concat(
+            [pd.json_normalize(page) for page in PAGES], ignore_index=True
+        )
+        for options in ({}, {"prefetch": True}, {"stream": True}):
+            with self.subTest(**options):
+                sky = fakeSky(pages, self.directory)
+                compiled = sky.get("users/extended", **options)
+                # Again with the plan learned on the first pull
+                again = sky.get("users/extended", **options)
+                uncompiled = sky.get("users/extended", compiled=False, **options)
+                pd.testing.assert_frame_equal(compiled, expected)
+                pd.testing.assert_frame_equal(again, expected)
+                pd.testing.assert_frame_equal(uncompiled, expected)
@@ -1,8 +1,11 @@
+import os
+import tempfile
+
 import pandas as pd
 import numpy as np
 
 from unittest import TestCase
-from sky import Sky
+from sky import EntityGraph, Mirror, Sky
 from dotenv import load_dotenv
 
 # Loading BB_API_Key from .env file
@@ -52,4 +55,37 @@ class TestGrades(TestCase):
         self.assertTrue(isinstance(client.getUsers(), pd.DataFrame))
 
     def test_multiple_getUsers(self):
-        self.assertTrue(isinstance(client.getUsers(['student', 'parent']), pd.DataFrame))
\ No newline at end of file
+        self.assertTrue(isinstance(client.getUsers(['student', 'parent']), pd.DataFrame))
+
+    def test_multiple_getUsers_unique(self):
+        roles = ['student', 'parent']
+        users = client.getUsers(roles)
+        self.assertTrue(users.id.is_unique)
+        self.assertEqual(roles, ['student', 'parent'])
+
+    def test_getUsers_fields(self):
+        users = client.getUsers(fields=['id', 'email'])
+        self.assertEqual(sorted(users.columns.tolist()), ['email', 'id', 'matched_roles'])
+
+    def test_snapshot(self):
+        # The snapshot holds the refresh token and client secret
+        with tempfile.TemporaryDirectory() as directory:
+            path = client.snapshot(os.path.join(directory, ".sky-snapshot"))
+            warm = Sky.from_snapshot(path)
+        self.assertIn("roles", warm.reference)
+        self.assertEqual(warm.getLevels(id=True), client.getLevels(id=True))
+
+    def test_mirror(self):
+        with tempfile.TemporaryDirectory() as directory:
+            mirror = Mirror(client, os.path.join(directory, ".sky-mirror.db"))
+            mirror.syncUsers()
+            self.assertEqual(mirror.syncUsers()["inserted"], 0)
+            self.assertEqual(
+                sorted(mirror.users().id.tolist()), sorted(client.getUsers().id.tolist())
+            )
+
+    def test_entity_graph(self):
+        graph = EntityGraph(client, roles="student").refresh(enrollments=False)
+        graph.update(enrollments=client.getStudentEnrollments(ID))
+        self.assertEqual(graph.user(ID)["id"], ID)
+        self.assertTrue(isinstance(graph.studentSections(ID), pd.DataFrame))
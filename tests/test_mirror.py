@@ -0,0 +1,75 @@
+import tempfile
+
+from unittest import TestCase
+
+from sky import Mirror
+from fakes import fakeSky
+
+LEVELS = {"count": 1, "value": [{"id": 5, "abbreviation": "US", "name": "Upper School"}]}
+
+
+def section(id: int, title: str) -> dict:
+    return {
+        "id": id,
+        "course_title": title,
+        "teachers": [{"id": 30 + id, "head": True, "first_name": "T"}],
+    }
+
+
+class TestMirror(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.sections = {1: section(1, "Algebra"), 2: section(2, "Biology")}
+        # Sections returned to requests with modified_since
+        self.modified = []
+
+    def pages(self, url, params):
+        if url.endswith("/levels"):
+            return LEVELS
+        if url.endswith("/academics/enrollments/7"):
+            if (params or {}).get("modified_since"):
+                return {"count": 1, "value": [{"id": 1, "grade": "B"}]}
+            return {"count": 2, "value": [{"id": 1, "grade": "A"}, {"id": 2, "grade": "A"}]}
+        if (params or {}).get("modified_since"):
+            return {"count": len(self.modified), "value": self.modified}
+        return {"count": 2, "value": list(self.sections.values())}
+
+    def mirror(self, modified_since: dict) -> Mirror:
+        mirror = Mirror(fakeSky(self.pages, self.directory), f"{self.directory}/mirror.db")
+        mirror.modified_since = modified_since
+        return mirror
+
+    def test_full_sync_deletes_missing_rows(self):
+        mirror = self.mirror({})
+        mirror.syncSections()
+        del self.sections[2]
+        counts = mirror.syncSections()
+        self.assertEqual(counts, {"inserted": 0, "updated": 0, "deleted": 1, "unchanged": 1})
+        self.assertEqual(mirror.sections().id.tolist(), [1])
+
+    def test_delta_sync_sections(self):
+        mirror = self.mirror({"academics/sections": "modified_since"})
+        mirror.syncSections()
+        self.modified = [section(2, "Chemistry")]
+        counts = mirror.syncSections()
+
+        self.assertEqual(counts, {"inserted": 0, "updated": 1, "deleted": 0, "unchanged": 0})
+        self.assertIn("modified_since", mirror.sky.client.calls[-1][1])
+        sections = mirror.sections()
+        self.assertEqual(sections.id.tolist(), [1, 2])
+        self.assertEqual(sections.course_title.tolist(), ["Algebra", "Chemistry"])
+        self.assertEqual(sections["teacher.id"].tolist(), [31, 32])
+
+    def test_delta_sync_enrollments(self):
+        # Entries are keyed on the endpoint with the user id written as {id}
+        mirror = self.mirror({"academics/enrollments/{id}": "modified_since"})
+        mirror.syncEnrollments(7)
+        counts = mirror.syncEnrollments(7)
+
+        self.assertEqual(counts, {"inserted": 0, "updated": 1, "deleted": 0, "unchanged": 0})
+        self.assertIn("modified_since", mirror.sky.client.calls[-1][1])
+        enrollments = mirror.enrollments(7)
+        self.assertEqual(enrollments.grade.tolist(), ["B", "A"])
+        self.assertEqual(enrollments.user_id.tolist(), [7, 7])
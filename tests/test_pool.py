@@ -0,0 +1,31 @@
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import TestCase
+
+import pandas as pd
+
+from fakes import fakeSky, pagedRecords
+
+USERS = [{"id": i, "info": {"grade": 9 + i % 4}} for i in range(9)]
+
+
+class TestProcessPool(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.sky = fakeSky(pagedRecords(USERS, 2), directory.name)
+        self.expected = pd.json_normalize(USERS)
+
+    def test_pool_per_call(self):
+        users = self.sky.get("users/extended", prefetch=True, processes=2)
+        pd.testing.assert_frame_equal(users, self.expected)
+
+    def test_shared_executor(self):
+        for executor in (ThreadPoolExecutor(2), ProcessPoolExecutor(2)):
+            with self.subTest(executor=type(executor).__name__), executor:
+                for _ in range(2):
+                    users = self.sky.get("users/extended", processes=executor)
+                    pd.testing.assert_frame_equal(users, self.expected)
+                # The executor is left running for the caller
+                self.assertEqual(executor.submit(len, "ab").result(), 2)
@@ -0,0 +1,53 @@
+import tempfile
+
+from unittest import TestCase
+
+from fakes import fakeSky
+
+ROLES = {"count": 2, "value": [
+    {"id": 1, "base_role_id": 14, "name": "Student"},
+    {"id": 2, "base_role_id": 3, "name": "Parent"},
+]}
+
+
+def pages(url, params):
+    if url.endswith("/roles"):
+        return ROLES
+    base_role = params["base_role_ids"]
+    return {"count": 2, "value": [{"id": base_role}, {"id": 100}]}
+
+
+class TestProfiling(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.sky = fakeSky(pages, directory.name)
+
+    def test_nested_blocks(self):
+        with self.sky.profile(memory=False) as outer:
+            self.sky.get("roles")
+            with self.sky.profile(memory=False) as inner:
+                self.sky.get("roles")
+            self.assertIs(self.sky.profiler, outer)
+            self.sky.get("roles")
+        self.assertIsNone(self.sky.profiler)
+        self.assertEqual(outer.report()["stages"]["network"]["calls"], 2)
+        self.assertEqual(inner.report()["stages"]["network"]["calls"], 1)
+
+    def test_blocks_ending_out_of_order(self):
+        first = self.sky.profile(memory=False)
+        second = self.sky.profile(memory=False)
+        first.__enter__()
+        latest = second.__enter__()
+        first.__exit__(None, None, None)
+        self.assertIs(self.sky.profiler, latest)
+        second.__exit__(None, None, None)
+        self.assertIsNone(self.sky.profiler)
+
+    def test_helper_counts_one_postprocess_call(self):
+        for compact in (False, True):
+            with self.subTest(compact=compact):
+                with self.sky.profile(memory=False) as profiler:
+                    users = self.sky.getUsers(["student", "parent"], compact=compact)
+                self.assertEqual(sorted(users.id.tolist()), [3, 14, 100])
+                self.assertEqual(profiler.report()["stages"]["postprocess"]["calls"], 1)
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import time
+
+from unittest import TestCase
+
+from sky import RateBudget
+
+
+class TestRateBudget(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "budget")
+
+    def test_capacity_is_a_burst(self):
+        budget = RateBudget(self.path, rate=5)
+        start = time.monotonic()
+        for _ in range(5):
+            budget.acquire()
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertAlmostEqual(budget._take(), 0.2, delta=0.05)
+
+    def test_rate_below_one(self):
+        budget = RateBudget(self.path, rate=0.5)
+        self.assertEqual(budget.capacity, 1)
+        budget.acquire(timeout=0)
+        with self.assertRaises(TimeoutError):
+            budget.acquire(timeout=0.5)
+        # One permit every 2 seconds
+        self.assertAlmostEqual(budget._take(), 2, delta=0.1)
+
+    def test_invalid_budgets(self):
+        with self.assertRaises(ValueError):
+            RateBudget(self.path, rate=0)
+        with self.assertRaises(ValueError):
+            RateBudget(self.path, rate=10, capacity=0.5)
+
+    def test_pause_is_shared(self):
+        budget = RateBudget(self.path, rate=100)
+        other = RateBudget(self.path, rate=100)
+        budget.pause(0.3)
+        start = time.monotonic()
+        other.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        with self.assertRaises(TimeoutError):
+            budget.pause(5)
+            other.acquire(timeout=1)
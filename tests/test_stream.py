@@ -0,0 +1,78 @@
+import tempfile
+
+from unittest import TestCase, mock, skipUnless
+
+import pandas as pd
+
+from sky import httpRequest
+from sky.httpRequest import StreamedPage
+from fakes import FakeResponse, fakeSky, pagedRecords
+
+USERS = [{"id": i, "name": f"u{i}", "info": {"grade": 9 + i % 4}} for i in range(25)]
+LIST = {
+    "count": 3,
+    "results": {
+        "rows": [
+            {"columns": [{"name": "id", "value": str(i)}, {"name": "x", "value": i}]}
+            for i in range(3)
+        ],
+        "total": 3,
+    },
+}
+
+
+class StreamedPageTests:
+    """Run against both parsers, see the subclasses below"""
+
+    def read(self, body: dict, path: str, size: int):
+        response = FakeResponse(body)
+        page = StreamedPage(response, path)
+        chunks = list(page.chunks(size))
+        self.assertTrue(response.closed)
+        return chunks, page.data
+
+    def test_value(self):
+        body = {"count": 25, "value": USERS, "next_link": "next"}
+        chunks, data = self.read(body, "value", 10)
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        self.assertEqual(sum(chunks, []), USERS)
+        self.assertEqual(data["next_link"], "next")
+        self.assertEqual(data["count"], 25)
+        self.assertFalse(data.get("value"))
+
+    def test_results_rows(self):
+        chunks, data = self.read(LIST, "results.rows", 2)
+        self.assertEqual(sum(chunks, []), LIST["results"]["rows"])
+        self.assertEqual(data["count"], 3)
+        self.assertEqual(data["results"]["total"], 3)
+
+    def test_missing_records(self):
+        chunks, data = self.read({"status": 404, "errors": ["not found"]}, "value", 10)
+        self.assertEqual(chunks, [])
+        self.assertEqual(data["status"], 404)
+
+    def test_get_and_list(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sky = fakeSky(pagedRecords(USERS, 10), directory)
+            pd.testing.assert_frame_equal(
+                sky.get("users/extended", stream=True), sky.get("users/extended")
+            )
+            sky = fakeSky(lambda url, params: LIST if "page=1" in url else {"count": 0}, directory)
+            pd.testing.assert_frame_equal(
+                sky.getAdvancedList(1, stream=True), sky.getAdvancedList(1)
+            )
+
+
+@skipUnless(httpRequest.ijson, "requires ijson")
+class TestIncrementalParsing(StreamedPageTests, TestCase):
+    def test_plain_values(self):
+        chunks, data = self.read({"value": [1, 2, 3]}, "value", 2)
+        self.assertEqual(chunks, [[1, 2], [3]])
+
+
+class TestBufferedParsing(StreamedPageTests, TestCase):
+    def setUp(self):
+        # Decoding the whole body as done without the optional ijson package
+        patcher = mock.patch.object(httpRequest, "ijson", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)